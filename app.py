@@ -1,10 +1,19 @@
 import streamlit as st
-from src.config import UI_CONFIG
+from src.config import downloader_registry, PREWARM_DOWNLOADERS, UI_CONFIG, METRICS_HOST, METRICS_PORT, BANDWIDTH_LIMIT, FILE_SERVER_HOST, FILE_SERVER_PORT, FILE_SERVER_URL
+from src.Core.bandwidth import bandwidth_manager
+from src.Core.fileserver import file_server
+from src.Core.metrics import configure_logging, start_exporter
 from src.ui.styles import load_css
 from src.ui.single_video import display_single_video_ui
 from src.ui.playlist import display_playlist_ui
-# Import the FFmpeg manager - just importing it ensures FFmpeg is configured
-import src.ffmpeg.manager
+
+# Structured JSON logs, the metrics endpoint and the file server if configured (all only set up once per process)
+configure_logging()
+if METRICS_PORT:
+    start_exporter(METRICS_PORT, host=METRICS_HOST)
+if FILE_SERVER_URL and FILE_SERVER_PORT:
+    file_server.start(FILE_SERVER_PORT, host=FILE_SERVER_HOST, base_url=FILE_SERVER_URL)
+bandwidth_manager.set_total_rate(BANDWIDTH_LIMIT)
 
 # Set page config
 st.set_page_config(**UI_CONFIG)
@@ -27,4 +36,8 @@ with tab2:
 
 # Footer
 st.markdown("---")
-st.markdown("Made with ❤️ for web development students")
\ No newline at end of file
+st.markdown("Made with ❤️ for web development students")
+
+# Warm the downloader backends now that the page is out (only once per process)
+if PREWARM_DOWNLOADERS:
+    downloader_registry.warm_up()
@@ -0,0 +1,89 @@
+"""
+Cold-start import benchmark
+
+Measures how long a fresh interpreter takes to import app.py (which renders
+the UI in Streamlit's bare mode) with lazy downloader loading, compared to
+eagerly importing the downloader backends first, as src/config.py used to.
+
+Usage:
+    python benchmarks/import_time.py [--runs 10] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    # Current behaviour: backends are imported on first use only
+    "lazy": "import app",
+    # Previous behaviour: the registry imported every backend (and yt-dlp) up front
+    "eager": "import src.Core.youtube, yt_dlp, app",
+}
+
+TIMER = """
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(elapsed, 'yt_dlp' in sys.modules)
+"""
+
+
+def measure(statement, runs):
+    """Run statement in `runs` fresh interpreters and return the timings in seconds"""
+    timings = []
+    loaded = False
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", TIMER.format(statement=statement)],
+            cwd=ROOT,
+            # Measure the import itself, not the background warm-up it starts
+            env=dict(os.environ, PREWARM_DOWNLOADERS="0"),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            check=True
+        )
+        elapsed, yt_dlp_loaded = result.stdout.strip().splitlines()[-1].split()
+        timings.append(float(elapsed))
+        loaded = yt_dlp_loaded == "True"
+    return timings, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters per scenario")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    report = {}
+    for name, statement in SCENARIOS.items():
+        timings, yt_dlp_loaded = measure(statement, args.runs)
+        report[name] = {
+            "median_s": statistics.median(timings),
+            "min_s": min(timings),
+            "max_s": max(timings),
+            "runs": args.runs,
+            "yt_dlp_loaded": yt_dlp_loaded,
+        }
+    report["saved_s"] = report["eager"]["median_s"] - report["lazy"]["median_s"]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for name in SCENARIOS:
+        r = report[name]
+        print(f"{name:>6}: median {r['median_s'] * 1000:7.1f} ms "
+              f"(min {r['min_s'] * 1000:.1f}, max {r['max_s'] * 1000:.1f}) "
+              f"yt_dlp loaded: {r['yt_dlp_loaded']}")
+    print(f" saved: {report['saved_s'] * 1000:7.1f} ms per cold start")
+
+
+if __name__ == "__main__":
+    main()
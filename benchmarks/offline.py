@@ -0,0 +1,347 @@
+"""
+Offline download benchmarks
+
+Runs the downloader against a local HTTP server serving synthetic MP4 and
+DASH media, through a stub yt-dlp extractor that claims YouTube-style URLs,
+so nothing touches the network. Every scenario runs in a fresh interpreter
+and reports latency, throughput, peak RSS and CPU time.
+
+Scenarios:
+    video_info      get_video_info with a cold metadata cache
+    direct_url      get_direct_stream_url with a cold metadata cache
+    single_video    download_video of one video
+    playlist        get_playlist_videos followed by download_many
+
+The server supports range requests and can add latency to every request
+and throttle each connection. Downloads use --quality 360p by default,
+which selects the progressive MP4; 720p and up pick the DASH video and
+audio streams and need FFmpeg to merge them.
+
+Usage:
+    python benchmarks/offline.py [--runs 5] [--size-mb 8] [--latency-ms 20]
+                                 [--bandwidth-mbps 0] [--connections 4] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ["video_info", "direct_url", "single_video", "playlist"]
+
+# Synthetic media is this block repeated, so any byte range can be served without a file
+PATTERN = random.Random(0).randbytes(64 * 1024)
+
+# Bytes written per throttled send
+SEND_CHUNK = 16 * 1024
+
+VIDEO_URL = "https://www.youtube.com/watch?v=bench{index:06d}"
+PLAYLIST_URL = "https://www.youtube.com/playlist?list=BENCH{count}"
+
+
+# --- Media server -------------------------------------------------------------
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """Serves /<name>.<ext>?size=<bytes> as synthetic media with range support"""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    bandwidth = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        match = re.search(r"[?&]size=(\d+)", self.path)
+        size = int(match.group(1)) if match else 1024 * 1024
+        start, end = 0, size - 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        byte_range = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if byte_range:
+            start = int(byte_range.group(1))
+            end = min(int(byte_range.group(2) or end), size - 1)
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        content_type = "audio/mp4" if self.path.split("?")[0].endswith(".m4a") else "video/mp4"
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+        try:
+            self._send_range(start, end)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_range(self, start, end):
+        position = start
+        started = time.monotonic()
+        while position <= end:
+            offset = position % len(PATTERN)
+            chunk = PATTERN[offset:offset + min(SEND_CHUNK, end - position + 1)]
+            self.wfile.write(chunk)
+            position += len(chunk)
+            if self.bandwidth:
+                # Sleep until this connection is back under its bandwidth
+                ahead = (position - start) / self.bandwidth - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+
+def start_server(latency, bandwidth):
+    """Start the media server on a free port in a background thread and return it"""
+    handler = type("ConfiguredMediaHandler", (MediaHandler,), {"latency": latency, "bandwidth": bandwidth})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Stub extractor -----------------------------------------------------------
+
+def install_stub_extractor(base_url, size):
+    """Make every YoutubeDL instance try the stub extractors before the real ones"""
+    import yt_dlp
+    from yt_dlp.extractor.common import InfoExtractor
+
+    class BenchVideoIE(InfoExtractor):
+        IE_NAME = "bench"
+        _VALID_URL = r"https?://(?:www\.)?youtube\.com/watch\?v=(?P<id>bench\d{6})"
+
+        def _real_extract(self, url):
+            video_id = self._match_id(url)
+            media = f"{base_url}/{video_id}"
+            return {
+                "id": video_id,
+                "title": f"Benchmark video {video_id}",
+                "duration": 60,
+                "thumbnail": f"{media}.jpg",
+                "formats": [
+                    # Progressive MP4
+                    {"format_id": "18", "url": f"{media}.mp4?size={size}", "ext": "mp4", "width": 640, "height": 360,
+                     "vcodec": "avc1.42001E", "acodec": "mp4a.40.2", "filesize": size},
+                    # DASH video-only and audio-only streams
+                    {"format_id": "136", "url": f"{media}-video.mp4?size={size}", "ext": "mp4", "width": 1280, "height": 720,
+                     "vcodec": "avc1.4d401f", "acodec": "none", "filesize": size},
+                    {"format_id": "140", "url": f"{media}-audio.m4a?size={size // 8}", "ext": "m4a",
+                     "vcodec": "none", "acodec": "mp4a.40.2", "abr": 128, "filesize": size // 8},
+                ],
+            }
+
+    class BenchPlaylistIE(InfoExtractor):
+        IE_NAME = "bench:playlist"
+        _VALID_URL = r"https?://(?:www\.)?youtube\.com/playlist\?list=(?P<id>BENCH(?P<count>\d+))"
+
+        def _real_extract(self, url):
+            match = self._match_valid_url(url)
+            entries = [
+                self.url_result(VIDEO_URL.format(index=i), video_id=f"bench{i:06d}", video_title=f"Benchmark video {i}")
+                for i in range(int(match.group("count")))
+            ]
+            return self.playlist_result(entries, match.group("id"), "Benchmark playlist")
+
+    original = yt_dlp.YoutubeDL.add_default_info_extractors
+
+    def add_default_info_extractors(self):
+        self.add_info_extractor(BenchVideoIE())
+        self.add_info_extractor(BenchPlaylistIE())
+        original(self)
+
+    yt_dlp.YoutubeDL.add_default_info_extractors = add_default_info_extractors
+
+
+# --- Scenarios (run in the worker process) -------------------------------------
+
+def run_scenario(name, args):
+    """Run one scenario args.runs times and return its measurements"""
+    sys.path.insert(0, ROOT)
+    install_stub_extractor(args.base_url, args.size_mb * 1024 * 1024)
+
+    from src.Core.cache import metadata_cache
+    from src.Core.storage import download_cache
+    from src.Core.youtube import YouTubeDownloader
+
+    # Keep downloads out of the project's cache, and don't let repeated runs hit it
+    work = tempfile.mkdtemp(prefix="offline-bench-")
+    download_cache.root = work
+    download_cache.files_dir = os.path.join(work, "files")
+    download_cache.work_root = os.path.join(work, "work")
+    download_cache.max_bytes = 0
+
+    downloader = YouTubeDownloader()
+    counter = iter(range(10 ** 6))
+
+    def video_info():
+        metadata_cache.clear()
+        return 0 if downloader.get_video_info(VIDEO_URL.format(index=next(counter))) else None
+
+    def direct_url():
+        metadata_cache.clear()
+        result = downloader.get_direct_stream_url(VIDEO_URL.format(index=next(counter)), args.quality)
+        return 0 if result and result.get("success") else None
+
+    def single_video():
+        result = downloader.download_video(VIDEO_URL.format(index=next(counter)), args.quality,
+                                           as_file=True, connections=args.connections)
+        if not result.success:
+            return None
+        size = result.size
+        result.close()
+        return size
+
+    def playlist():
+        metadata_cache.clear()
+        entries = downloader.get_playlist_videos(PLAYLIST_URL.format(count=args.playlist_size))
+        results = downloader.download_many([entry.url for entry in entries], args.quality,
+                                           max_workers=args.workers, as_file=True,
+                                           connections=args.connections)
+        if not entries or not all(result.success for result in results):
+            return None
+        size = sum(result.size for result in results)
+        for result in results:
+            result.close()
+        return size
+
+    operation = locals()[name]
+    for _ in range(args.warmup):
+        operation()
+
+    latencies, sizes, failures = [], [], 0
+    cpu_start = os.times()
+    wall_start = time.perf_counter()
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        size = operation()
+        elapsed = time.perf_counter() - started
+        if size is None:
+            failures += 1
+            continue
+        latencies.append(elapsed)
+        sizes.append(size)
+    wall = time.perf_counter() - wall_start
+    cpu_end = os.times()
+    cpu = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+    shutil.rmtree(work, ignore_errors=True)
+
+    report = {
+        "runs": args.runs,
+        "failures": failures,
+        "cpu_s": cpu,
+        "cpu_utilization": cpu / wall if wall else 0.0,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    if latencies:
+        ordered = sorted(latencies)
+        report.update({
+            "latency_median_s": statistics.median(latencies),
+            "latency_p95_s": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            "latency_min_s": ordered[0],
+            "latency_max_s": ordered[-1],
+        })
+        if any(sizes):
+            report["bytes_per_run"] = statistics.median(sizes)
+            report["throughput_mbps"] = sum(sizes) / sum(latencies) / (1024 * 1024)
+    return report
+
+
+def measure(name, args, base_url):
+    """Run a scenario in a fresh interpreter and return its report"""
+    command = [
+        sys.executable, os.path.abspath(__file__), "--worker", name, "--base-url", base_url,
+        "--runs", str(args.runs), "--warmup", str(args.warmup), "--size-mb", str(args.size_mb),
+        "--connections", str(args.connections), "--quality", args.quality,
+        "--playlist-size", str(args.playlist_size), "--workers", str(args.workers),
+    ]
+    result = subprocess.run(command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True)
+    # yt-dlp may print to stdout too; the report is the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="scenario to run (repeatable, default: all)")
+    parser.add_argument("--runs", type=int, default=5, help="measured runs per scenario")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured runs per scenario")
+    parser.add_argument("--size-mb", type=int, default=8, help="size of each synthetic video")
+    parser.add_argument("--latency-ms", type=float, default=20, help="latency added to every request")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0, help="per-connection bandwidth in MiB/s, 0 for unlimited")
+    parser.add_argument("--connections", type=int, default=4, help="connections per download")
+    parser.add_argument("--quality", default="360p", help="requested quality")
+    parser.add_argument("--playlist-size", type=int, default=5, help="videos in the playlist scenario")
+    parser.add_argument("--workers", type=int, default=3, help="parallel downloads in the playlist scenario")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--worker", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_scenario(args.worker, args)))
+        return
+
+    server = start_server(args.latency_ms / 1000, args.bandwidth_mbps * 1024 * 1024)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    report = {
+        "config": {
+            "size_mb": args.size_mb,
+            "latency_ms": args.latency_ms,
+            "bandwidth_mbps": args.bandwidth_mbps,
+            "connections": args.connections,
+            "quality": args.quality,
+            "playlist_size": args.playlist_size,
+            "workers": args.workers,
+        },
+        "scenarios": {},
+    }
+    try:
+        for name in args.scenario or SCENARIOS:
+            report["scenarios"][name] = measure(name, args, base_url)
+    finally:
+        server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for name, r in report["scenarios"].items():
+        line = f"{name:>12}: "
+        if "latency_median_s" in r:
+            line += f"median {r['latency_median_s'] * 1000:8.1f} ms, p95 {r['latency_p95_s'] * 1000:8.1f} ms"
+        if "throughput_mbps" in r:
+            line += f", {r['throughput_mbps']:7.1f} MiB/s"
+        line += f", peak RSS {r['peak_rss_mb']:6.1f} MB, CPU {r['cpu_s']:.2f} s"
+        if r["failures"]:
+            line += f", {r['failures']}/{r['runs']} failed"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Asyncio API
+
+yt-dlp only offers blocking calls, so ``AsyncDownloader`` runs them on a
+bounded worker pool of its own and awaits them from the event loop: a
+service can have hundreds of lookups in flight from a single loop while
+only ``max_workers`` threads exist. Video info answered from the metadata
+cache doesn't leave the loop at all.
+"""
+
+import asyncio
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Any, AsyncIterator, Callable, List, Optional, Sequence, Union
+
+from .base import BaseDownloader, DownloadResult, PlaylistEntry, ResolvedVideo, VideoInfo
+
+# Worker threads shared by all blocking calls of one AsyncDownloader
+DEFAULT_MAX_WORKERS = 32
+
+# Playlist entries fetched per worker call; YouTube playlist pages hold 100
+DEFAULT_PLAYLIST_BATCH = 50
+
+
+class DownloadCancelled(Exception):
+    """Raised from the progress hook to stop a download whose stream was cancelled"""
+
+
+class ProgressStream:
+    """Async iterator over the progress of a running download
+
+    Iterating yields yt-dlp progress dicts. The download thread only ever
+    keeps the latest one and wakes the loop once per batch, so a slow
+    consumer sees fewer, fresher updates instead of a backlog. Iteration
+    ends when the download does; await the stream for its DownloadResult.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._latest: Optional[dict] = None
+        self._scheduled = False
+        self._ready = asyncio.Event()
+        self._done = False
+        self._cancelled = False
+        self._task: Optional["asyncio.Future[DownloadResult]"] = None
+
+    def _push(self, d: dict) -> None:
+        # Called from the download thread
+        if self._cancelled:
+            raise DownloadCancelled("Download was cancelled")
+        with self._lock:
+            self._latest = d
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._loop.call_soon_threadsafe(self._ready.set)
+
+    def _finish(self, _task=None) -> None:
+        self._done = True
+        self._ready.set()
+
+    def _start(self, task: "asyncio.Future[DownloadResult]") -> None:
+        self._task = task
+        task.add_done_callback(self._finish)
+
+    def cancel(self) -> None:
+        """Stop the download at its next progress callback"""
+        self._cancelled = True
+
+    def __aiter__(self) -> "ProgressStream":
+        return self
+
+    async def __anext__(self) -> dict:
+        while True:
+            with self._lock:
+                latest, self._latest = self._latest, None
+                self._scheduled = False
+                self._ready.clear()
+            if latest is not None:
+                return latest
+            if self._done:
+                raise StopAsyncIteration
+            await self._ready.wait()
+
+    def __await__(self):
+        return self._task.__await__()
+
+
+class AsyncDownloader:
+    """Asyncio front-end for a downloader
+
+    Args:
+        downloader (BaseDownloader): Downloader whose blocking methods are wrapped
+        max_workers (int): Threads available to blocking calls
+    """
+
+    def __init__(self, downloader: BaseDownloader, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.downloader = downloader
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='async-downloader')
+
+    async def _run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def resolve(self, url: str) -> Optional[ResolvedVideo]:
+        """Extract video information once and return a reusable handle
+        
+        The handle gets a private copy of the info, so even a cached lookup
+        uses a worker thread, keeping the copy off the loop.
+        """
+        return await self._run(self.downloader.resolve, url)
+
+    async def get_video_info(self, url: Union[str, ResolvedVideo]) -> Optional[VideoInfo]:
+        """Get video information without downloading"""
+        if isinstance(url, str):
+            # Only read, so the cached info needs no copy
+            url = self.downloader.peek(url, copy_info=False) or url
+        if isinstance(url, ResolvedVideo):
+            # Nothing left to fetch, so build the result on the loop
+            return self.downloader.get_video_info(url)
+        return await self._run(self.downloader.get_video_info, url)
+
+    async def get_playlist_videos(self, url: str) -> List[PlaylistEntry]:
+        """Get the entries of a playlist without extracting each video"""
+        return await self._run(self.downloader.get_playlist_videos, url)
+    
+    async def iter_playlist_videos(
+        self,
+        url: str,
+        start: int = 0,
+        limit: Optional[int] = None,
+        batch_size: int = DEFAULT_PLAYLIST_BATCH,
+    ) -> AsyncIterator[PlaylistEntry]:
+        """Yield the entries of a playlist as they arrive
+        
+        Entries are pulled from the blocking enumeration in batches, so the
+        loop is woken once per batch rather than once per entry.
+        """
+        entries = self.downloader.iter_playlist_videos(url, start, limit)
+        fetching: Optional[Future] = None
+        
+        def close():
+            # A batch may still be running if the consumer was cancelled while
+            # awaiting it; the enumeration can only be closed once it returned
+            if fetching is not None:
+                wait([fetching])
+            entries.close()
+        
+        try:
+            while True:
+                fetching = self._executor.submit(lambda: list(itertools.islice(entries, batch_size)))
+                batch = await asyncio.wrap_future(fetching)
+                if not batch:
+                    return
+                for entry in batch:
+                    yield entry
+        finally:
+            # Returns the enumeration's pooled YoutubeDL when iteration stops early.
+            # Submitted before awaiting, so it runs even if this task is cancelled again.
+            closing = self._executor.submit(close)
+            await asyncio.wrap_future(closing)
+
+    async def download_video(
+        self,
+        url: Union[str, ResolvedVideo],
+        quality: str,
+        progress_hook: Optional[Callable[[dict], None]] = None,
+        as_file: bool = False,
+        connections: int = 1,
+        bandwidth_group: Optional[str] = None,
+    ) -> DownloadResult:
+        """Download a single video
+
+        progress_hook is called from the download thread, as with the blocking API;
+        use ``stream_download`` to consume progress on the loop instead.
+        """
+        return await self._run(
+            self.downloader.download_video, url, quality,
+            progress_hook=progress_hook, as_file=as_file, connections=connections,
+            bandwidth_group=bandwidth_group
+        )
+
+    async def download_audio(
+        self,
+        url: Union[str, ResolvedVideo],
+        quality: str = "best",
+        progress_hook: Optional[Callable[[dict], None]] = None,
+        as_file: bool = False,
+        connections: int = 1,
+        bandwidth_group: Optional[str] = None,
+    ) -> DownloadResult:
+        """Download only the audio track of a video (see BaseDownloader.download_audio)"""
+        return await self._run(
+            self.downloader.download_audio, url, quality,
+            progress_hook=progress_hook, as_file=as_file, connections=connections,
+            bandwidth_group=bandwidth_group
+        )
+
+    async def download_clip(
+        self,
+        url: Union[str, ResolvedVideo],
+        quality: str,
+        start: float,
+        end: float,
+        progress_hook: Optional[Callable[[dict], None]] = None,
+        as_file: bool = False,
+        bandwidth_group: Optional[str] = None,
+    ) -> DownloadResult:
+        """Download only the [start, end) seconds of a video (see BaseDownloader.download_clip)"""
+        return await self._run(
+            self.downloader.download_clip, url, quality, start, end,
+            progress_hook=progress_hook, as_file=as_file, bandwidth_group=bandwidth_group
+        )
+
+    def stream_download(
+        self,
+        url: Union[str, ResolvedVideo],
+        quality: str,
+        as_file: bool = False,
+        connections: int = 1,
+    ) -> ProgressStream:
+        """Start a download and return a stream of its progress
+
+        Must be called from a running event loop::
+
+            stream = downloader.stream_download(url, "720p", as_file=True)
+            async for d in stream:
+                print(d.get('downloaded_bytes'))
+            result = await stream
+
+        Returns:
+            ProgressStream: Async iterator of progress dicts, awaitable for the result
+        """
+        stream = ProgressStream(asyncio.get_running_loop())
+        stream._start(asyncio.ensure_future(
+            self.download_video(url, quality, progress_hook=stream._push, as_file=as_file, connections=connections)
+        ))
+        return stream
+
+    async def download_many(
+        self,
+        urls: Sequence[Union[str, ResolvedVideo]],
+        quality: str,
+        max_concurrency: int = 3,
+        as_file: bool = False,
+        connections: int = 1,
+    ) -> List[DownloadResult]:
+        """Download several videos with at most max_concurrency running at once
+
+        Returns:
+            List[DownloadResult]: Results in the same order as ``urls``
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def download(url):
+            async with semaphore:
+                try:
+                    return await self.download_video(url, quality, as_file=as_file, connections=connections)
+                except Exception as e:
+                    return DownloadResult(success=False, error=str(e))
+
+        return list(await asyncio.gather(*(download(url) for url in urls)))
+
+    async def aclose(self) -> None:
+        """Wait for running calls and release the worker threads"""
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def __aenter__(self) -> "AsyncDownloader":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
@@ -0,0 +1,316 @@
+"""
+Bandwidth scheduling
+
+A process-wide cap on download throughput, shared fairly between the
+active download groups (a job, or a single download_video call).
+
+Every group gets a weighted share of the cap. Groups that can't use their
+share, because upstream is slower, are capped at what they actually
+achieve and the rest is redistributed (weighted max-min fairness). Shares
+are recomputed whenever a group starts or finishes, and at most once per
+``REBALANCE_INTERVAL`` while downloads report progress.
+
+Each group paces its downloads by reserving transfer time for every block
+it receives: the thread that received the block sleeps until the group's
+rate allows it. yt-dlp's downloaders are paced from the progress hook,
+which they call as blocks arrive; SegmentedFD paces each of its
+connections directly through the ``bandwidth_throttle`` option.
+"""
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from .metrics import metrics, record_stage
+
+# Seconds between two rebalances triggered by progress
+REBALANCE_INTERVAL = 1.0
+
+# Seconds of transfer a group may burst after being idle
+BURST_SECONDS = 0.25
+
+# Smoothing factor of the achieved-rate moving average
+RATE_SMOOTHING = 0.3
+
+# A group achieving less than this fraction of its allocation is limited upstream
+UPSTREAM_LIMITED = 0.8
+
+# Headroom given to upstream-limited groups so they can show they could do more
+DEMAND_HEADROOM = 1.25
+
+# A group is only judged upstream-limited once its allocation was stable this long
+SETTLE_SECONDS = 3.0
+
+# Relative change of an allocation that restarts the settle time
+ALLOCATION_CHANGE = 0.1
+
+# Fixed read size for yt-dlp's HTTP downloader while a cap is set. By default it
+# doubles its reads up to megabytes, which would make pacing very coarse.
+PACED_BUFFER_SIZE = 64 * 1024
+
+_anonymous = itertools.count()
+
+
+class _Group:
+    def __init__(self, name: str, weight: float):
+        self.name = name
+        self.weight = weight
+        # Allocations currently held in this group
+        self.members = 0
+        self.allocated: Optional[float] = None
+        self.allocated_at = time.monotonic()
+        self.achieved = 0.0
+        self.total_bytes = 0
+        self.started = time.monotonic()
+        self._next_free = 0.0
+        self._last_sample = self.started
+        self._sample_bytes = 0
+        # Last downloaded_bytes per file, to turn cumulative progress into deltas
+        self._progress: Dict[str, int] = {}
+
+    def demand(self, now: float) -> Optional[float]:
+        """Rate this group can use, or None if it could use more than it has"""
+        if self.allocated is None or now - self.allocated_at < SETTLE_SECONDS:
+            return None
+        if self.achieved >= self.allocated * UPSTREAM_LIMITED:
+            return None
+        return self.achieved * DEMAND_HEADROOM
+
+    def allocate(self, rate: Optional[float], now: float) -> None:
+        if rate is None or self.allocated is None or abs(rate - self.allocated) > self.allocated * ALLOCATION_CHANGE:
+            self.allocated_at = now
+        self.allocated = rate
+
+    def reserve(self, count: int) -> float:
+        """Reserve transfer time for count bytes and return how long to wait for it"""
+        if not self.allocated or count <= 0:
+            return 0.0
+        now = time.monotonic()
+        self._next_free = max(self._next_free, now - BURST_SECONDS) + count / self.allocated
+        return max(0.0, self._next_free - now)
+
+    def observe(self, d: dict) -> int:
+        """Account a progress dict and return the number of new bytes it reports"""
+        downloaded = d.get('downloaded_bytes') or 0
+        # The final event of a file only names the file, not its .part file
+        key = d.get('tmpfilename') or d.get('filename') or ''
+        if key.endswith('.part'):
+            key = key[:-len('.part')]
+        previous = self._progress.get(key, 0)
+        self._progress[key] = downloaded
+        delta = max(0, downloaded - previous)
+        self.total_bytes += delta
+        self._sample_bytes += delta
+
+        now = time.monotonic()
+        elapsed = now - self._last_sample
+        if elapsed >= REBALANCE_INTERVAL / 2:
+            rate = self._sample_bytes / elapsed
+            self.achieved = rate if not self.achieved else RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self.achieved
+            self._last_sample = now
+            self._sample_bytes = 0
+        return delta
+
+
+class Allocation:
+    """A download's membership in a bandwidth group
+
+    Returned by ``BandwidthManager.allocate``; use it as a context manager
+    so the group's share is released when the download ends.
+    """
+
+    def __init__(self, manager: "BandwidthManager", group: _Group):
+        self.manager = manager
+        self.group = group
+        self._released = False
+
+    def throttle(self, count: int) -> None:
+        """Wait until the group's rate allows another count bytes"""
+        with self.manager._lock:
+            delay = self.group.reserve(count)
+        if delay > 0:
+            time.sleep(delay)
+
+    def progress_hook(self, d: dict) -> None:
+        """Progress hook measuring the achieved rate and pacing the download"""
+        with self.manager._lock:
+            delta = self.group.observe(d)
+        # SegmentedFD already paced these bytes as they were read
+        if not d.get('throttled'):
+            self.throttle(delta)
+        self.manager._maybe_rebalance()
+
+    @contextmanager
+    def bound(self, params: Dict[str, Any]) -> Iterator[None]:
+        """Let the downloaders of a YoutubeDL params dict pace themselves for the duration of the block"""
+        params['bandwidth_throttle'] = self.throttle
+        if self.manager.total_rate:
+            params.update(buffersize=PACED_BUFFER_SIZE, noresizebuffer=True)
+        try:
+            yield
+        finally:
+            for key in ('bandwidth_throttle', 'buffersize', 'noresizebuffer'):
+                params.pop(key, None)
+
+    @property
+    def allocated(self) -> Optional[float]:
+        return self.group.allocated
+
+    @property
+    def achieved(self) -> float:
+        return self.group.achieved
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self.manager._leave(self.group)
+
+    def __enter__(self) -> "Allocation":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class BandwidthManager:
+    """Process-wide download rate cap with weighted fair sharing
+
+    Args:
+        total_rate (float): Cap in bytes per second for all downloads; 0 means unlimited
+    """
+
+    def __init__(self, total_rate: float = 0):
+        self.total_rate = total_rate
+        self._groups: Dict[str, _Group] = {}
+        self._weights: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._last_rebalance = 0.0
+
+    def set_total_rate(self, total_rate: float) -> None:
+        """Change the cap; running downloads pick it up straight away"""
+        with self._lock:
+            self.total_rate = total_rate
+            self._rebalance()
+
+    def set_weight(self, group: str, weight: float) -> None:
+        """Weight of a group's share, relative to the default of 1"""
+        with self._lock:
+            self._weights[group] = weight
+            if group in self._groups:
+                self._groups[group].weight = weight
+                self._rebalance()
+
+    def allocate(self, group: Optional[str] = None, weight: Optional[float] = None) -> Allocation:
+        """Join a group (creating it if needed) until the allocation is released
+
+        A job holds an allocation of its group for its whole run, so the group
+        and its measurements survive between the job's downloads.
+
+        Args:
+            group (str, optional): Downloads of the same group share one allocation;
+                by default the download gets a group of its own
+            weight (float, optional): Set the group's weight
+        """
+        name = group or f"download-{next(_anonymous)}"
+        with self._lock:
+            if weight is not None:
+                self._weights[name] = weight
+            entry = self._groups.get(name)
+            if entry is None:
+                entry = _Group(name, self._weights.get(name, 1.0))
+                self._groups[name] = entry
+            entry.weight = self._weights.get(name, entry.weight)
+            entry.members += 1
+            self._rebalance()
+        return Allocation(self, entry)
+
+    def _leave(self, group: _Group) -> None:
+        finished = False
+        with self._lock:
+            group.members -= 1
+            if group.members <= 0 and self._groups.get(group.name) is group:
+                del self._groups[group.name]
+                self._weights.pop(group.name, None)
+                finished = True
+            self._rebalance()
+        if finished:
+            elapsed = time.monotonic() - group.started
+            record_stage('bandwidth', elapsed, group=group.name, bytes=group.total_bytes,
+                         average_rate=round(group.total_bytes / elapsed) if elapsed > 0 else 0)
+
+    def _maybe_rebalance(self) -> None:
+        if time.monotonic() - self._last_rebalance < REBALANCE_INTERVAL:
+            return
+        with self._lock:
+            self._rebalance()
+
+    def _rebalance(self) -> None:
+        """Recompute every group's share (lock held)"""
+        now = time.monotonic()
+        self._last_rebalance = now
+        groups = list(self._groups.values())
+        if not self.total_rate:
+            for group in groups:
+                group.allocate(None, now)
+            return
+
+        # Weighted water-filling: satisfy groups that need less than their share,
+        # then split what is left among the others by weight
+        shares: Dict[str, float] = {}
+        remaining = float(self.total_rate)
+        pending = groups
+        while pending:
+            total_weight = sum(group.weight for group in pending)
+            satisfied = [
+                group for group in pending
+                if group.demand(now) is not None and group.demand(now) < remaining * group.weight / total_weight
+            ]
+            if not satisfied:
+                for group in pending:
+                    shares[group.name] = remaining * group.weight / total_weight
+                remaining = 0.0
+                break
+            for group in satisfied:
+                shares[group.name] = group.demand(now)
+                remaining -= shares[group.name]
+            pending = [group for group in pending if group not in satisfied]
+
+        # If every group is limited upstream, hand out the rest anyway so a
+        # group that speeds up again isn't held back until the next rebalance
+        if remaining > 0 and groups:
+            total_weight = sum(group.weight for group in groups)
+            for group in groups:
+                shares[group.name] += remaining * group.weight / total_weight
+
+        for group in groups:
+            group.allocate(shares[group.name], now)
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Allocated and achieved rates (bytes per second) of every active group"""
+        with self._lock:
+            return {
+                group.name: {
+                    'weight': group.weight,
+                    'members': group.members,
+                    'allocated': group.allocated,
+                    'achieved': group.achieved,
+                    'bytes': group.total_bytes,
+                }
+                for group in self._groups.values()
+            }
+
+    def _collect(self):
+        samples = [('bandwidth_limit_bytes_per_second', 'gauge', 'Total download rate cap, 0 if unlimited', {}, self.total_rate)]
+        for name, group in self.report().items():
+            if group['allocated'] is not None:
+                samples.append(('bandwidth_allocated_bytes_per_second', 'gauge', 'Rate allocated to a download group', {'group': name}, group['allocated']))
+            samples.append(('bandwidth_achieved_bytes_per_second', 'gauge', 'Rate achieved by a download group', {'group': name}, group['achieved']))
+        return samples
+
+
+# Process-wide manager; unlimited until a cap is set
+bandwidth_manager = BandwidthManager()
+metrics.register_collector(bandwidth_manager._collect)
@@ -1,6 +1,15 @@
+import io
+import itertools
+import os
+import shutil
+import weakref
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union, Callable, Sequence, Iterator, BinaryIO, Tuple
+
+from .formats import FormatIndex
+from .metrics import timed
 
 @dataclass
 class VideoInfo:
@@ -10,30 +19,243 @@ class VideoInfo:
     available_qualities: List[str]
     thumbnail_url: str = ""
 
+@dataclass(frozen=True)
+class PlaylistEntry:
+    """Lightweight playlist entry built from flat-playlist metadata"""
+    id: str
+    url: str
+    title: str
+    duration: int = 0
+    thumbnail_url: str = ""
+
+@dataclass
+class ResolvedVideo:
+    """Handle to an already-extracted video
+
+    Returned by ``BaseDownloader.resolve`` and accepted by the other downloader
+    methods in place of a URL, so a video is only extracted once. ``formats``
+    indexes the info's formats; it is built from ``info`` unless given.
+    """
+    url: str
+    video_id: str
+    info: Dict[str, Any] = field(default_factory=dict)
+    formats: Optional[FormatIndex] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.formats is None:
+            self.formats = FormatIndex.from_info(self.info)
+
+    @property
+    def title(self) -> str:
+        return self.info.get('title', 'Video')
+
+    @property
+    def duration(self) -> int:
+        return self.info.get('duration') or 0
+
+    @property
+    def thumbnail_url(self) -> str:
+        return self.info.get('thumbnail', '')
+
 @dataclass
 class DownloadResult:
+    """Outcome of a download
+
+    The output is either held in memory (``data``) or left on disk
+    (``file_path``). File-backed results own ``work_dir``, which is removed
+    by ``close()`` or when the result is garbage collected.
+    """
     success: bool
     data: Optional[bytes] = None
     error: Optional[str] = None
     video_info: Optional[Dict[str, Any]] = None
+    file_path: Optional[str] = None
+    work_dir: Optional[str] = None
+
+    def __post_init__(self):
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.work_dir, True) if self.work_dir else None
+
+    @property
+    def size(self) -> int:
+        """Size of the output in bytes"""
+        if self.data is not None:
+            return len(self.data)
+        if self.file_path and os.path.exists(self.file_path):
+            return os.path.getsize(self.file_path)
+        return 0
+
+    def open(self) -> BinaryIO:
+        """Open the output for reading"""
+        if self.file_path:
+            return open(self.file_path, 'rb')
+        return io.BytesIO(self.data or b'')
+
+    def iter_chunks(self, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """Yield the output in chunks without loading it all into memory"""
+        with self.open() as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def read_bytes(self) -> bytes:
+        """Return the whole output as bytes"""
+        if self.data is not None:
+            return self.data
+        with timed('read', size=self.size), self.open() as f:
+            return f.read()
+
+    def close(self) -> None:
+        """Delete the file-backed output, if any"""
+        if self._finalizer:
+            self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 class BaseDownloader(ABC):
     """Base class for video downloaders"""
     
     @abstractmethod
-    def get_video_info(self, url: str) -> VideoInfo:
+    def resolve(self, url: str) -> Optional[ResolvedVideo]:
+        """Extract video information once and return a reusable handle"""
+        pass
+    
+    def warm_up(self) -> None:
+        """Prepare expensive resources in the background so the first request doesn't pay for them
+        
+        Must return immediately. Downloaders without such resources do nothing.
+        """
+        pass
+    
+    def peek(self, url: str, copy_info: bool = True) -> Optional[ResolvedVideo]:
+        """Return a handle for url if it can be built without any network access
+        
+        Used by the async API to answer from cached metadata without a worker
+        thread. Downloaders without a metadata cache return None.
+        
+        Args:
+            copy_info (bool): Give the handle a private copy of the info dict; without
+                it the handle shares the cached dict and must only be read
+        """
+        return None
+    
+    @abstractmethod
+    def get_video_info(self, url: Union[str, ResolvedVideo]) -> VideoInfo:
         """Get video information without downloading"""
         pass
     
     @abstractmethod
-    def download_video(self, url: str, quality: str) -> DownloadResult:
+    def download_video(self, url: Union[str, ResolvedVideo], quality: str, progress_hook=None, as_file: bool = False, connections: int = 1, bandwidth_group: Optional[str] = None) -> DownloadResult:
         """Download a single video"""
         pass
     
+    def download_audio(self, url: Union[str, ResolvedVideo], quality: str = "best", progress_hook=None, as_file: bool = False, connections: int = 1, bandwidth_group: Optional[str] = None) -> DownloadResult:
+        """Download only the audio track of a video, at most at a bitrate like "128k"
+        
+        Downloaders without audio-only formats don't support this.
+        """
+        return DownloadResult(success=False, error="Audio-only downloads are not supported by this downloader")
+    
+    def download_clip(self, url: Union[str, ResolvedVideo], quality: str, start: float, end: float, progress_hook=None, as_file: bool = False, bandwidth_group: Optional[str] = None) -> DownloadResult:
+        """Download only the [start, end) seconds of a video
+        
+        Downloaders that can't fetch part of a video don't support this.
+        """
+        return DownloadResult(success=False, error="Clips are not supported by this downloader")
+    
+    def download_many(
+        self,
+        urls: Sequence[Union[str, ResolvedVideo]],
+        quality: str,
+        max_workers: int = 3,
+        progress_hook: Optional[Callable[[int, dict], None]] = None,
+        on_complete: Optional[Callable[[int, DownloadResult], None]] = None,
+        on_tick: Optional[Callable[[], None]] = None,
+        tick_interval: float = 0.5,
+        as_file: bool = False,
+        connections: int = 1,
+        bandwidth_group: Optional[str] = None,
+        audio_only: bool = False,
+        clip: Optional[Tuple[float, float]] = None,
+    ) -> List[DownloadResult]:
+        """Download several videos concurrently with a bounded worker pool
+        
+        Args:
+            urls: Video URLs or ResolvedVideo handles
+            quality (str): Video quality for every item (e.g. "720p"), or the audio
+                quality (e.g. "128k") with audio_only
+            max_workers (int): Maximum number of downloads running at once
+            progress_hook (callable, optional): Called as ``progress_hook(index, d)`` from
+                worker threads with each item's yt-dlp progress dict
+            on_complete (callable, optional): Called as ``on_complete(index, result)`` in
+                the calling thread as items finish, i.e. in completion order
+            on_tick (callable, optional): Called in the calling thread every
+                ``tick_interval`` seconds while downloads are running
+            as_file (bool): Return file-backed results instead of in-memory bytes
+            connections (int): Concurrent connections used by each item's download
+            bandwidth_group (str, optional): Bandwidth group shared by every item
+            audio_only (bool): Download only the audio track of each item (see download_audio)
+            clip (tuple, optional): Download only this (start, end) range in seconds of
+                each item (see download_clip)
+            
+        Returns:
+            List[DownloadResult]: Results in the same order as ``urls``
+        """
+        results: List[Optional[DownloadResult]] = [None] * len(urls)
+        if not urls:
+            return []
+        
+        def make_hook(index):
+            if progress_hook is None:
+                return None
+            return lambda d: progress_hook(index, d)
+        
+        download = self.download_audio if audio_only else self.download_video
+        if clip is not None:
+            # ffmpeg fetches a clip over one connection per format
+            download = lambda url, quality, connections=1, **kwargs: self.download_clip(url, quality, *clip, **kwargs)
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+            futures = {
+                executor.submit(download, url, quality, progress_hook=make_hook(i), as_file=as_file,
+                                connections=connections, bandwidth_group=bandwidth_group): i
+                for i, url in enumerate(urls)
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=tick_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = DownloadResult(success=False, error=str(e))
+                    results[index] = result
+                    if on_complete:
+                        on_complete(index, result)
+                if pending and on_tick:
+                    on_tick()
+        
+        return results
+    
     @abstractmethod
-    def get_playlist_videos(self, url: str) -> List[str]:
-        """Get list of video URLs from a playlist"""
+    def get_playlist_videos(self, url: str) -> List[PlaylistEntry]:
+        """Get the entries of a playlist without extracting each video"""
         pass
+    
+    def iter_playlist_videos(self, url: str, start: int = 0, limit: Optional[int] = None) -> Iterator[PlaylistEntry]:
+        """Yield the entries of a playlist, optionally only a window of them
+        
+        Downloaders that can enumerate a playlist incrementally yield entries as
+        they arrive; this default fetches the whole list first.
+        """
+        end = None if limit is None else start + limit
+        yield from itertools.islice(self.get_playlist_videos(url), start, end)
 
     @abstractmethod
     def supports_url(self, url: str) -> bool:
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from .metrics import register_stats
+
+# Default cache policy. Direct media URLs returned by YouTube expire after a
+# few hours, so keep the TTL well below that.
+DEFAULT_TTL = 1800
+DEFAULT_MAX_ENTRIES = 256
+
+
+class MetadataCache:
+    """Thread-safe TTL/LRU cache for extracted video metadata
+
+    Entries expire ``ttl`` seconds after they were stored. When more than
+    ``max_entries`` are stored, the least recently used entry is evicted.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, count_miss: bool = True) -> Optional[Any]:
+        """Return the cached value for key, or None if missing or expired
+
+        Pass ``count_miss=False`` when a miss is followed by a lookup that counts it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += count_miss
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += count_miss
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value, evicting the least recently used entries if needed"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key: str, loader: Callable[[], Any]) -> Any:
+        """Return the cached value for key, calling loader on a miss
+
+        The loader runs outside the lock, so a slow extraction does not
+        block lookups for other keys. Falsy results are not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        value = loader()
+        if value:
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: str) -> None:
+        """Remove a single entry"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Process-wide cache shared by every downloader instance and Streamlit session
+metadata_cache = MetadataCache()
+register_stats('metadata_cache', metadata_cache.stats, counters=('hits', 'misses', 'evictions'), gauges=('size', 'hit_rate'))
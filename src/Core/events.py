@@ -0,0 +1,269 @@
+"""
+Progress event bus
+
+Downloaders publish structured progress events into a bounded queue and
+return straight away; a single dispatcher thread fans them out to the
+subscribers. Each subscriber has its own coalescing interval: within an
+interval only the latest event per download is kept, so a UI refreshing
+twice a second sees two updates per download instead of one per chunk,
+and a slow subscriber never holds up the download loop.
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .metrics import register_stats
+
+DOWNLOADING = 'downloading'
+FINISHED = 'finished'
+DONE = 'done'
+ERROR = 'error'
+
+# Stages that end a download; they are delivered without waiting for the interval
+FINAL_STAGES = (DONE, ERROR)
+
+# Events waiting for the dispatcher; when full, new in-flight events are dropped
+DEFAULT_MAX_QUEUE = 10000
+
+# Default coalescing interval per subscriber in seconds
+DEFAULT_INTERVAL = 0.5
+
+# How long the dispatcher waits for events before flushing due subscribers
+DISPATCH_TICK = 0.05
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    """Progress of one download
+
+    Args:
+        source (str): Publisher of the event, e.g. a job ID
+        index (int): Item within the source
+        stage (str): downloading, finished (a file is complete), done or error
+    """
+    source: str
+    index: int
+    stage: str
+    downloaded_bytes: int = 0
+    total_bytes: Optional[int] = None
+    speed: Optional[float] = None
+    eta: Optional[float] = None
+    error: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_ytdlp(cls, source: str, index: int, d: dict) -> "ProgressEvent":
+        """Build an event from a yt-dlp progress hook dict"""
+        return cls(
+            source=source,
+            index=index,
+            stage=d.get('status') or DOWNLOADING,
+            downloaded_bytes=d.get('downloaded_bytes') or 0,
+            total_bytes=d.get('total_bytes') or d.get('total_bytes_estimate'),
+            speed=d.get('speed'),
+            eta=d.get('eta'),
+        )
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        return (self.source, self.index)
+
+    @property
+    def is_final(self) -> bool:
+        return self.stage in FINAL_STAGES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class Subscription:
+    """A subscriber's coalescing buffer
+
+    Created by ``ProgressBus.subscribe``. Only touched by the dispatcher
+    thread, apart from ``unsubscribe``.
+    """
+
+    def __init__(self, bus: "ProgressBus", callback: Callable[[List[ProgressEvent]], None], interval: float, source: Optional[str]):
+        self.bus = bus
+        self.callback = callback
+        self.interval = interval
+        self.source = source
+        self.delivered = 0
+        self._pending: Dict[Tuple[str, int], ProgressEvent] = {}
+        self._last_flush = 0.0
+        self._has_final = False
+
+    def _offer(self, event: ProgressEvent) -> None:
+        if self.source is not None and event.source != self.source:
+            return
+        # Keep the final event of a download even if a late chunk callback follows it
+        previous = self._pending.get(event.key)
+        if previous is not None and previous.is_final and not event.is_final:
+            return
+        self._pending[event.key] = event
+        self._has_final = self._has_final or event.is_final
+
+    def _flush(self, now: float, force: bool = False) -> None:
+        if not self._pending:
+            return
+        if not (force or self._has_final or now - self._last_flush >= self.interval):
+            return
+        events = list(self._pending.values())
+        self._pending.clear()
+        self._has_final = False
+        self._last_flush = now
+        try:
+            self.callback(events)
+            self.delivered += len(events)
+        except Exception as e:
+            print(f"Progress subscriber error: {str(e)}")
+
+    def unsubscribe(self) -> None:
+        self.bus.unsubscribe(self)
+
+
+class ProgressBus:
+    """Queue between progress publishers and rate-limited subscribers
+
+    Args:
+        max_queue (int): Maximum number of undispatched events
+    """
+
+    def __init__(self, max_queue: int = DEFAULT_MAX_QUEUE):
+        self._queue: "queue.Queue[ProgressEvent]" = queue.Queue(maxsize=max_queue)
+        self._subscriptions: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, event: ProgressEvent) -> bool:
+        """Queue an event without blocking the caller
+
+        In-flight events are dropped when the queue is full, since a later
+        one supersedes them anyway; final events wait for room.
+
+        Returns:
+            bool: Whether the event was queued
+        """
+        self._ensure_dispatcher()
+        try:
+            if event.is_final:
+                self._queue.put(event, timeout=1)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.published += 1
+        return True
+
+    def subscribe(
+        self,
+        callback: Callable[[List[ProgressEvent]], None],
+        interval: float = DEFAULT_INTERVAL,
+        source: Optional[str] = None,
+    ) -> Subscription:
+        """Register a subscriber
+
+        Args:
+            callback (callable): Called from the dispatcher thread with the latest
+                event of every download that changed since the previous call
+            interval (float): Minimum seconds between two calls; final events
+                are delivered immediately
+            source (str, optional): Only receive events from this source
+
+        Returns:
+            Subscription: Handle to unsubscribe with
+        """
+        subscription = Subscription(self, callback, interval, source)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def _ensure_dispatcher(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name='progress-bus', daemon=True)
+                self._thread.start()
+
+    def _dispatch(self) -> None:
+        while True:
+            try:
+                event = self._queue.get(timeout=DISPATCH_TICK)
+            except queue.Empty:
+                event = None
+            with self._lock:
+                subscriptions = list(self._subscriptions)
+            if event is not None:
+                for subscription in subscriptions:
+                    subscription._offer(event)
+            now = time.monotonic()
+            for subscription in subscriptions:
+                subscription._flush(now)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            subscribers = len(self._subscriptions)
+        return {
+            'published': self.published,
+            'dropped': self.dropped,
+            'queued': self._queue.qsize(),
+            'subscribers': subscribers,
+        }
+
+
+class ProgressMetrics:
+    """Metrics sink aggregating progress events across all downloads"""
+
+    def __init__(self):
+        self.active: Dict[Tuple[str, int], ProgressEvent] = {}
+        self.completed = 0
+        self.failed = 0
+        self.completed_bytes = 0
+        self._lock = threading.Lock()
+
+    def attach(self, bus: ProgressBus, interval: float = 1.0) -> Subscription:
+        return bus.subscribe(self.handle, interval=interval)
+
+    def handle(self, events: List[ProgressEvent]) -> None:
+        with self._lock:
+            for event in events:
+                if event.stage == DONE:
+                    previous = self.active.pop(event.key, None)
+                    self.completed += 1
+                    self.completed_bytes += event.downloaded_bytes or (previous.downloaded_bytes if previous else 0)
+                elif event.stage == ERROR:
+                    self.active.pop(event.key, None)
+                    self.failed += 1
+                else:
+                    self.active[event.key] = event
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            active = list(self.active.values())
+            return {
+                'active_downloads': len(active),
+                'completed_downloads': self.completed,
+                'failed_downloads': self.failed,
+                'downloaded_bytes': self.completed_bytes + sum(e.downloaded_bytes for e in active),
+                'speed_bytes_per_second': sum(e.speed or 0 for e in active if e.stage == DOWNLOADING),
+            }
+
+
+# Process-wide bus shared by the job manager, the UI and metrics
+progress_bus = ProgressBus()
+progress_metrics = ProgressMetrics()
+progress_metrics.attach(progress_bus)
+register_stats('progress', progress_metrics.snapshot, gauges=('active_downloads', 'speed_bytes_per_second'))
+register_stats('progress_bus', progress_bus.stats, counters=('published', 'dropped'), gauges=('queued',))
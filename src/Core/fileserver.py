@@ -0,0 +1,329 @@
+"""
+Streaming file endpoint
+
+Serves finished downloads over plain HTTP next to the Streamlit app, so a
+browser downloads them straight from disk instead of through Streamlit's
+media manager, which holds the whole file in memory before the first byte
+is sent.
+
+Files are published under an unguessable token and sent with
+``socket.sendfile`` (zero-copy ``sendfile(2)`` where the OS supports it),
+so the video never passes through Python heap memory. Range requests are
+supported, which lets browsers resume and media players seek. Results
+that only exist in memory are sent with chunked transfer encoding.
+"""
+
+import mimetypes
+import os
+import re
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+from urllib.parse import quote, unquote
+
+from .metrics import register_stats
+
+# Seconds a published link stays valid
+DEFAULT_LINK_TTL = 60 * 60
+
+# Bytes per chunk of a chunked response
+CHUNK_SIZE = 1024 * 1024
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+@dataclass
+class _Published:
+    filename: str
+    mime: str
+    expires_at: float
+    path: Optional[str] = None
+    chunks: Optional[Callable[[], Iterable[bytes]]] = None
+    # Keeps the owner of the file (e.g. a DownloadResult) from being collected,
+    # which would delete the file while the link is valid
+    owner: Any = field(default=None, repr=False)
+    # What the link was published for, so publishing it again reuses the token
+    source: Hashable = None
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range Range header into an inclusive (start, end)
+
+    Returns:
+        tuple: The range, or None to send the whole file (no header, or several ranges)
+
+    Raises:
+        ValueError: The range can't be satisfied
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match:
+        # Multiple or malformed ranges may be answered with the whole file
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+
+class FileServer:
+    """Publishes files under temporary links and serves them over HTTP
+
+    Args:
+        link_ttl (float): Seconds a published link stays valid
+    """
+
+    def __init__(self, link_ttl: float = DEFAULT_LINK_TTL):
+        self.link_ttl = link_ttl
+        self.base_url: Optional[str] = None
+        self._published: Dict[str, _Published] = {}
+        self._tokens_by_source: Dict[Hashable, str] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self.requests = 0
+        self.bytes_sent = 0
+
+    @property
+    def running(self) -> bool:
+        return self._server is not None
+
+    def start(self, port: int, host: str = '127.0.0.1', base_url: Optional[str] = None) -> bool:
+        """Serve published files on a background thread (once per process)
+
+        Args:
+            port (int): Port to listen on
+            host (str): Interface to listen on; loopback only by default
+            base_url (str, optional): URL browsers reach the server at; defaults
+                to ``http://localhost:<port>``
+
+        Returns:
+            bool: Whether the server is running
+        """
+        with self._lock:
+            if self._server is None:
+                try:
+                    server = ThreadingHTTPServer((host, port), _FileHandler)
+                except OSError as e:
+                    print(f"Could not start file server on port {port}: {str(e)}")
+                    return False
+                server.daemon_threads = True
+                server.file_server = self
+                self._server = server
+                self.base_url = (base_url or f"http://localhost:{server.server_address[1]}").rstrip('/')
+                threading.Thread(target=server.serve_forever, name='file-server', daemon=True).start()
+            return True
+
+    def stop(self) -> None:
+        with self._lock:
+            server, self._server = self._server, None
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    def publish(self, path: str, filename: Optional[str] = None, mime: Optional[str] = None, owner: Any = None) -> str:
+        """Publish a file and return the URL it can be downloaded from
+
+        Publishing the same file again returns its existing link while valid.
+
+        Args:
+            path (str): File to serve; it must stay in place while the link is valid
+            filename (str, optional): Name the browser saves the file as
+            mime (str, optional): Content type, guessed from the filename by default
+            owner (optional): Object kept alive as long as the link, e.g. the
+                DownloadResult that deletes the file when collected
+        """
+        filename = filename or os.path.basename(path)
+        return self._add(path, _Published(filename=filename, mime=mime or _guess_type(filename),
+                                          expires_at=0, path=path, owner=owner))
+
+    def publish_chunks(self, chunks: Callable[[], Iterable[bytes]], filename: str, mime: Optional[str] = None, owner: Any = None) -> str:
+        """Publish content produced by a chunk iterator factory, e.g. ``result.iter_chunks``
+
+        Sent with chunked transfer encoding, without range support. Publishing
+        for the same owner again returns its existing link while valid.
+        """
+        return self._add(('chunks', id(owner if owner is not None else chunks)),
+                         _Published(filename=filename, mime=mime or _guess_type(filename),
+                                    expires_at=0, chunks=chunks, owner=owner))
+
+    def publish_result(self, result, filename: str, mime: Optional[str] = None) -> str:
+        """Publish the output of a DownloadResult, from disk if it has a file"""
+        if result.file_path:
+            return self.publish(result.file_path, filename, mime, owner=result)
+        return self.publish_chunks(lambda: result.iter_chunks(CHUNK_SIZE), filename, mime, owner=result)
+
+    def _add(self, source: Hashable, entry: _Published) -> str:
+        with self._lock:
+            self._prune()
+            token = self._tokens_by_source.get(source)
+            if token is None:
+                token = secrets.token_urlsafe(16)
+                self._tokens_by_source[source] = token
+            entry.source = source
+            entry.expires_at = time.time() + self.link_ttl
+            self._published[token] = entry
+        return self.url(token, entry.filename)
+
+    def url(self, token: str, filename: str) -> str:
+        path = f"/files/{token}/{quote(filename)}"
+        return f"{self.base_url}{path}" if self.base_url else path
+
+    def revoke(self, token: str) -> None:
+        with self._lock:
+            entry = self._published.pop(token, None)
+            if entry:
+                self._tokens_by_source.pop(entry.source, None)
+
+    def _lookup(self, token: str) -> Optional[_Published]:
+        with self._lock:
+            self._prune()
+            return self._published.get(token)
+
+    def _prune(self) -> None:
+        """Drop expired links (lock held)"""
+        now = time.time()
+        for token in [token for token, entry in self._published.items() if entry.expires_at <= now]:
+            entry = self._published.pop(token)
+            self._tokens_by_source.pop(entry.source, None)
+
+    def _record(self, sent: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += sent
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'published': len(self._published),
+                'requests': self.requests,
+                'bytes_sent': self.bytes_sent,
+            }
+
+
+def _guess_type(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def _content_disposition(filename: str) -> str:
+    # ASCII fallback for old clients, UTF-8 name for everyone else
+    fallback = filename.encode('ascii', 'replace').decode('ascii').replace('"', '_').replace('?', '_')
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
+class _FileHandler(BaseHTTPRequestHandler):
+    # Keep-alive, and chunked responses for content of unknown length
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body: bool) -> None:
+        server: FileServer = self.server.file_server
+        parts = self.path.split('?')[0].split('/')
+        if len(parts) < 3 or parts[1] != 'files':
+            self.send_error(404)
+            return
+        entry = server._lookup(unquote(parts[2]))
+        if entry is None:
+            self.send_error(404, "Link expired or unknown")
+            return
+
+        if entry.path is None:
+            self._serve_chunks(server, entry, send_body)
+            return
+
+        try:
+            f = open(entry.path, 'rb')
+        except OSError:
+            self.send_error(404, "File no longer available")
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            try:
+                byte_range = parse_range(self.headers.get('Range'), size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            start, end = byte_range if byte_range else (0, size - 1)
+            length = max(0, end - start + 1)
+            self.send_response(206 if byte_range else 200)
+            self.send_header('Content-Type', entry.mime)
+            self.send_header('Content-Length', str(length))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-Disposition', _content_disposition(entry.filename))
+            self.send_header('Last-Modified', self.date_time_string(int(stat.st_mtime)))
+            self.send_header('Cache-Control', 'private, no-transform')
+            if byte_range:
+                self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+            self.end_headers()
+
+            if not send_body or length == 0:
+                return
+            sent = 0
+            try:
+                # Zero-copy from the page cache to the socket where supported
+                sent = self.connection.sendfile(f, offset=start, count=length)
+            except (BrokenPipeError, ConnectionResetError):
+                # The browser cancelled or paused the download
+                self.close_connection = True
+            finally:
+                server._record(sent)
+
+    def _serve_chunks(self, server: FileServer, entry: _Published, send_body: bool) -> None:
+        # HTTP/1.0 clients don't understand chunks; the end of the body is the end of the connection
+        chunked = self.request_version != 'HTTP/1.0'
+        self.send_response(200)
+        self.send_header('Content-Type', entry.mime)
+        self.send_header('Content-Disposition', _content_disposition(entry.filename))
+        self.send_header('Cache-Control', 'private, no-transform')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.close_connection = True
+        self.end_headers()
+        if not send_body:
+            return
+
+        sent = 0
+        try:
+            for chunk in entry.chunks():
+                if not chunk:
+                    continue
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk)
+                sent += len(chunk)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            server._record(sent)
+
+
+# Process-wide server; links only work once start() was called
+file_server = FileServer()
+register_stats('file_server', file_server.stats, counters=('requests', 'bytes_sent'), gauges=('published',))
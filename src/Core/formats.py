@@ -0,0 +1,263 @@
+"""
+Format index
+
+yt-dlp returns the formats of a video as a flat list, sorted from worst to
+best. ``FormatIndex`` is built once per extracted video and groups that
+list by stream type, height and container, so the quality list and the
+format chosen for a download are looked up instead of re-derived by
+scanning the list (or by a yt-dlp format string) on every call.
+
+Selection mirrors the format strings the downloader used to pass to
+yt-dlp: from ``MERGE_MIN_HEIGHT`` up the best video-only stream is merged
+with the best audio-only stream, preferring mp4/m4a, and otherwise the best
+format carrying both is used, preferring mp4.
+"""
+
+import bisect
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# From this height on, separate video and audio streams are preferred (and merged)
+MERGE_MIN_HEIGHT = 720
+
+# Container preferred for each stream type, as long as the rest of the constraints allow
+PREFERRED_VIDEO_EXT = 'mp4'
+PREFERRED_AUDIO_EXT = 'm4a'
+
+
+def _has_video(f: dict) -> bool:
+    return f.get('vcodec') != 'none'
+
+
+def _has_audio(f: dict) -> bool:
+    return f.get('acodec') != 'none'
+
+
+def _audio_bitrate(f: dict) -> float:
+    return f.get('abr') or f.get('tbr') or 0
+
+
+def format_size(f: dict) -> int:
+    """Exact or approximate size of a format in bytes, 0 if unknown"""
+    return f.get('filesize') or f.get('filesize_approx') or 0
+
+
+@dataclass(frozen=True)
+class FormatChoice:
+    """Formats selected for a download: one format, or video and audio to merge
+
+    The format dicts belong to the cached video info and must not be modified.
+    """
+    formats: Tuple[dict, ...]
+
+    @property
+    def format_id(self) -> str:
+        """Format selector for yt-dlp, e.g. ``137+140``"""
+        return '+'.join(f['format_id'] for f in self.formats)
+
+    @property
+    def merged(self) -> bool:
+        return len(self.formats) > 1
+
+    @property
+    def main(self) -> dict:
+        """The format carrying the video (the only one unless merged)"""
+        return self.formats[0]
+
+    @property
+    def height(self) -> Optional[int]:
+        return self.main.get('height')
+
+    @property
+    def ext(self) -> str:
+        return self.main.get('ext') or ''
+
+    @property
+    def filesize(self) -> int:
+        """Total size in bytes, 0 if unknown"""
+        return sum(format_size(f) for f in self.formats)
+
+
+class _Bucket:
+    """Formats of one stream type, best first, with a per-height lookup"""
+
+    def __init__(self, formats: Iterable[dict]):
+        # yt-dlp lists formats worst first
+        self.formats = list(formats)[::-1]
+        by_height: Dict[int, List[dict]] = {}
+        for f in self.formats:
+            if f.get('height'):
+                by_height.setdefault(f['height'], []).append(f)
+        self.heights = sorted(by_height)
+        self.by_height = by_height
+        self._rank = {id(f): rank for rank, f in enumerate(self.formats)}
+
+    def best(self, max_height: Optional[int], accept) -> Optional[dict]:
+        """Best format of at most max_height (any height if None) accepted by the filter"""
+        if max_height is None:
+            return next((f for f in self.formats if accept(f)), None)
+        # Like yt-dlp's [height<=N] filter, the best ranked format of any height up
+        # to the limit wins, which need not be the tallest
+        end = bisect.bisect_right(self.heights, max_height)
+        best = None
+        for height in self.heights[:end]:
+            f = next((f for f in self.by_height[height] if accept(f)), None)
+            if f is not None and (best is None or self._rank[id(f)] < self._rank[id(best)]):
+                best = f
+        return best
+
+
+class FormatIndex:
+    """Formats of one video indexed by stream type, height, container, codec and size
+
+    Args:
+        formats (list): The ``formats`` of an extracted info dict, as sorted by yt-dlp
+    """
+
+    def __init__(self, formats: Sequence[dict]):
+        formats = [f for f in formats if f.get('format_id')]
+        self.by_id: Dict[str, dict] = {f['format_id']: f for f in formats}
+        self.video_only = _Bucket(f for f in formats if _has_video(f) and not _has_audio(f))
+        self.audio_only = _Bucket(f for f in formats if _has_audio(f) and not _has_video(f))
+        combined = [f for f in formats if _has_video(f) and _has_audio(f)]
+        # Like yt-dlp's "best", fall back to any format if none carries both streams
+        self.combined = _Bucket(combined or formats)
+        self.by_ext: Dict[str, List[dict]] = {}
+        for f in formats[::-1]:
+            self.by_ext.setdefault(f.get('ext') or '', []).append(f)
+        self._choices: Dict[tuple, Optional[FormatChoice]] = {}
+
+    @classmethod
+    def from_info(cls, info: dict) -> "FormatIndex":
+        return cls(info.get('formats') or [])
+
+    @property
+    def heights(self) -> List[int]:
+        """Heights available with video, ascending"""
+        return sorted(set(self.video_only.heights) | set(self.combined.heights))
+
+    def available_qualities(self, supported: Sequence[str]) -> List[str]:
+        """Qualities (e.g. "720p") of ``supported`` this video offers, best first
+
+        Heights of mp4 formats carrying both streams come first, since they play
+        without merging; with fewer than two of those, every video height counts.
+        An empty result means nothing matched.
+        """
+        heights = {
+            height for height, group in self.combined.by_height.items()
+            if any(f.get('ext') == PREFERRED_VIDEO_EXT and _has_video(f) and _has_audio(f) for f in group)
+        }
+        qualities = {f"{height}p" for height in heights} & set(supported)
+        if len(qualities) <= 1:
+            qualities |= {f"{height}p" for height in self.heights} & set(supported)
+        return sorted(qualities, key=lambda q: int(q.rstrip('p')), reverse=True)
+
+    def select(
+        self,
+        height: int,
+        max_filesize: Optional[int] = None,
+        vcodec: Optional[str] = None,
+        max_bitrate: Optional[float] = None,
+        direct: bool = False,
+    ) -> Optional[FormatChoice]:
+        """Best formats for a quality under constraints
+
+        Answers are memoized per set of arguments, so repeated lookups (every
+        session asking for the same video and quality) cost a dict lookup.
+
+        Args:
+            height (int): Maximum video height, e.g. 720
+            max_filesize (int, optional): Maximum total size in bytes; formats of
+                unknown size count as 0
+            vcodec (str, optional): Required video codec prefix, e.g. "avc1"
+            max_bitrate (float, optional): Maximum total bitrate (tbr) in kbit/s; unknown counts as 0
+            direct (bool): Only formats with a single direct URL, i.e. no DASH manifests
+
+        Returns:
+            FormatChoice: The selected format(s), or None if nothing matches
+        """
+        key = (height, max_filesize, vcodec, max_bitrate, direct)
+        if key not in self._choices:
+            self._choices[key] = self._select(height, max_filesize, vcodec, max_bitrate, direct)
+        return self._choices[key]
+
+    def _select(self, height, max_filesize, vcodec, max_bitrate, direct) -> Optional[FormatChoice]:
+        def accept(f, ext=None, size_limit=max_filesize, bitrate_limit=max_bitrate):
+            if ext and f.get('ext') != ext:
+                return False
+            if direct and 'dash' in (f.get('protocol') or ''):
+                return False
+            if vcodec and _has_video(f) and not (f.get('vcodec') or '').startswith(vcodec):
+                return False
+            if size_limit is not None and format_size(f) > size_limit:
+                return False
+            if bitrate_limit is not None and (f.get('tbr') or 0) > bitrate_limit:
+                return False
+            return True
+
+        if height >= MERGE_MIN_HEIGHT:
+            for video_ext, audio_ext in ((PREFERRED_VIDEO_EXT, PREFERRED_AUDIO_EXT), (None, None)):
+                video = self.video_only.best(height, lambda f: accept(f, video_ext))
+                if video is None:
+                    continue
+                # The audio stream gets what the video stream left of the limits
+                audio = self.audio_only.best(None, lambda f: accept(
+                    f, audio_ext,
+                    size_limit=None if max_filesize is None else max_filesize - format_size(video),
+                    bitrate_limit=None if max_bitrate is None else max_bitrate - (video.get('tbr') or 0),
+                ))
+                if audio is not None:
+                    return FormatChoice((video, audio))
+
+        for ext in (PREFERRED_VIDEO_EXT, None):
+            f = self.combined.best(height, lambda f: accept(f, ext))
+            if f is not None:
+                return FormatChoice((f,))
+        return None
+
+    def select_audio(
+        self,
+        max_bitrate: Optional[float] = None,
+        max_filesize: Optional[int] = None,
+        direct: bool = False,
+    ) -> Optional[FormatChoice]:
+        """Best audio-only format, for downloads that skip the video
+
+        Prefers m4a, then any container. If no format is within the bitrate,
+        the one with the lowest bitrate is used instead. Memoized like select().
+
+        Args:
+            max_bitrate (float, optional): Maximum audio bitrate (abr) in kbit/s; unknown counts as 0
+            max_filesize (int, optional): Maximum size in bytes; unknown counts as 0
+            direct (bool): Only formats with a single direct URL, i.e. no DASH manifests
+
+        Returns:
+            FormatChoice: The selected format, or None if the video has no audio-only format
+        """
+        key = ('audio', max_bitrate, max_filesize, direct)
+        if key not in self._choices:
+            self._choices[key] = self._select_audio(max_bitrate, max_filesize, direct)
+        return self._choices[key]
+
+    def _select_audio(self, max_bitrate, max_filesize, direct) -> Optional[FormatChoice]:
+        def usable(f):
+            if direct and 'dash' in (f.get('protocol') or ''):
+                return False
+            return max_filesize is None or format_size(f) <= max_filesize
+
+        def accept(f, ext=None):
+            if ext and f.get('ext') != ext:
+                return False
+            if max_bitrate is not None and _audio_bitrate(f) > max_bitrate:
+                return False
+            return usable(f)
+
+        for ext in (PREFERRED_AUDIO_EXT, None):
+            f = self.audio_only.best(None, lambda f: accept(f, ext))
+            if f is not None:
+                return FormatChoice((f,))
+
+        candidates = [f for f in self.audio_only.formats if usable(f)]
+        if not candidates:
+            return None
+        return FormatChoice((min(candidates, key=_audio_bitrate),))
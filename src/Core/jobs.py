@@ -0,0 +1,348 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from .base import BaseDownloader, DownloadResult, PlaylistEntry, ResolvedVideo
+from .bandwidth import bandwidth_manager
+from .events import DONE, DOWNLOADING, ERROR, FINISHED, ProgressBus, ProgressEvent, progress_bus
+from .metrics import metrics, record_error, record_stage
+
+# Number of jobs that run at the same time across all sessions
+DEFAULT_MAX_JOBS = 4
+
+# Finished jobs (and their files) are dropped after this many seconds
+DEFAULT_JOB_TTL = 60 * 60
+
+# Failed items are retried this many times; retries resume from partial files
+DEFAULT_JOB_RETRIES = 2
+
+# Jobs see at most one progress update per item in this many seconds
+DEFAULT_PROGRESS_INTERVAL = 0.25
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class JobCancelled(Exception):
+    """Raised from the progress hook to stop a cancelled job's downloads"""
+
+
+@dataclass
+class DownloadJob:
+    """A batch of downloads running in the background
+
+    Single-video downloads are a batch of one. All fields are written by the
+    worker threads and read by the UI, which polls them from session state.
+    """
+    id: str
+    urls: List[Union[str, ResolvedVideo]]
+    quality: str
+    max_workers: int = 1
+    connections: int = 1
+    # Relative share of the global bandwidth cap
+    weight: float = 1.0
+    # Only the audio track of each item, with quality an audio quality (e.g. "128k")
+    audio_only: bool = False
+    # Only this (start, end) range in seconds of each item
+    clip: Optional[Tuple[float, float]] = None
+    status: str = QUEUED
+    results: List[Optional[DownloadResult]] = field(default_factory=list)
+    # Latest progress event dict per item, coalesced by the progress bus
+    progress: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    # Item indexes in the order they finished
+    completed: List[int] = field(default_factory=list)
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_requested: bool = False
+    attempts: int = 0
+    bus: ProgressBus = field(default=progress_bus, repr=False)
+
+    def __post_init__(self):
+        if not self.results:
+            self.results = [None] * len(self.urls)
+
+    @property
+    def total(self) -> int:
+        return len(self.urls)
+
+    @property
+    def is_done(self) -> bool:
+        return self.status in (FINISHED, FAILED, CANCELLED)
+
+    @property
+    def downloaded_bytes(self) -> int:
+        return sum(p.get('downloaded_bytes', 0) or 0 for p in list(self.progress.values()))
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(p.get('total_bytes', 0) or p.get('total_bytes_estimate', 0) or 0 for p in list(self.progress.values()))
+
+    @property
+    def fraction(self) -> float:
+        """Overall progress between 0 and 1"""
+        if self.is_done:
+            return 1.0
+        if self.total_bytes and len(self.progress) == self.total:
+            return min(self.downloaded_bytes / self.total_bytes, 1.0)
+        return len(self.completed) / self.total if self.total else 0.0
+
+    @property
+    def elapsed(self) -> float:
+        if not self.started_at:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def bandwidth(self) -> Optional[Dict[str, Any]]:
+        """Allocated and achieved rates in bytes per second while the job is running"""
+        return bandwidth_manager.report().get(self.id)
+
+    def successful_results(self) -> List[DownloadResult]:
+        """Successful results in completion order"""
+        return [self.results[i] for i in self.completed if self.results[i] and self.results[i].success]
+
+    def cancel(self) -> None:
+        self.cancel_requested = True
+
+    def _on_progress(self, index: int, d: dict) -> None:
+        if self.cancel_requested:
+            raise JobCancelled("Job was cancelled")
+        self.bus.publish(ProgressEvent.from_ytdlp(self.id, index, d))
+
+    def _on_complete(self, index: int, result: DownloadResult) -> None:
+        self.results[index] = result
+        self.completed.append(index)
+        self.bus.publish(ProgressEvent(
+            source=self.id,
+            index=index,
+            stage=DONE if result.success else ERROR,
+            downloaded_bytes=result.size if result.success else 0,
+            error=result.error
+        ))
+
+    def close(self) -> None:
+        """Release file-backed results"""
+        for result in self.results:
+            if result:
+                result.close()
+
+
+class JobManager:
+    """Runs download jobs on a shared worker pool, outside any Streamlit script run
+    
+    Jobs publish their progress on the progress bus; the manager subscribes to
+    it and keeps each job's ``progress`` up to date for the UI to poll.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int = DEFAULT_MAX_JOBS,
+        job_ttl: float = DEFAULT_JOB_TTL,
+        retries: int = DEFAULT_JOB_RETRIES,
+        bus: ProgressBus = progress_bus,
+        progress_interval: float = DEFAULT_PROGRESS_INTERVAL,
+    ):
+        self.job_ttl = job_ttl
+        self.retries = retries
+        self.bus = bus
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix='download-job')
+        self._jobs: Dict[str, DownloadJob] = {}
+        self._lock = threading.Lock()
+        self._subscription = bus.subscribe(self._on_events, interval=progress_interval)
+
+    def submit(
+        self,
+        downloader: BaseDownloader,
+        urls: Sequence[Union[str, ResolvedVideo]],
+        quality: str,
+        max_workers: int = 1,
+        connections: int = 1,
+        weight: float = 1.0,
+        audio_only: bool = False,
+        clip: Optional[Tuple[float, float]] = None,
+    ) -> str:
+        """Queue a download job and return its ID
+
+        Args:
+            downloader (BaseDownloader): Downloader used for every item
+            urls: Video URLs or ResolvedVideo handles
+            quality (str): Video quality for every item (e.g. "720p")
+            max_workers (int): Maximum number of items of this job downloaded at once
+            connections (int): Concurrent connections per item download
+            weight (float): Share of the global bandwidth cap relative to other jobs
+            audio_only (bool): Download only the audio track of each item
+            clip (tuple, optional): Download only this (start, end) range in seconds of each item
+
+        Returns:
+            str: Job ID to poll with get()
+        """
+        self.prune()
+        job = DownloadJob(id=uuid.uuid4().hex, urls=list(urls), quality=quality,
+                          max_workers=max_workers, connections=connections, weight=weight,
+                          audio_only=audio_only, clip=clip, bus=self.bus)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, downloader, job)
+        return job.id
+
+    def _run(self, downloader: BaseDownloader, job: DownloadJob) -> None:
+        if job.cancel_requested:
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            return
+
+        job.status = RUNNING
+        job.started_at = time.time()
+        record_stage('queue_wait', job.started_at - job.created_at, job_id=job.id)
+        # Every item of the job draws from one bandwidth share, held for the whole run
+        allocation = bandwidth_manager.allocate(job.id, weight=job.weight)
+        try:
+            pending = list(range(job.total))
+            while pending and not job.cancel_requested and job.attempts <= self.retries:
+                job.attempts += 1
+                self._run_items(downloader, job, pending)
+                pending = [i for i in pending if not (job.results[i] and job.results[i].success)]
+                
+                # Failed items go back to "in progress" for the retry, which resumes
+                # from the partial files the failed attempt left behind
+                if pending and job.attempts <= self.retries:
+                    job.completed = [i for i in job.completed if i not in pending]
+            
+            if job.cancel_requested:
+                job.status = CANCELLED
+            elif job.successful_results():
+                job.status = FINISHED
+            else:
+                job.status = FAILED
+                errors = [r.error for r in job.results if r and r.error]
+                job.error = errors[0] if errors else "No video could be downloaded"
+        except Exception as e:
+            print(f"Job error: {str(e)}")
+            record_error('job', e, job_id=job.id)
+            job.status = FAILED
+            job.error = str(e)
+        finally:
+            allocation.release()
+            job.finished_at = time.time()
+            metrics.inc('jobs_total', help_text='Finished jobs by status', status=job.status)
+            record_stage('job', job.elapsed, job_id=job.id, status=job.status, items=job.total,
+                         attempts=job.attempts, bytes=sum(r.size for r in job.successful_results()))
+
+    def _run_items(self, downloader: BaseDownloader, job: DownloadJob, indexes: List[int]) -> None:
+        # Results stay on disk so queued and finished jobs don't hold video bytes in memory
+        downloader.download_many(
+            [job.urls[i] for i in indexes],
+            job.quality,
+            max_workers=job.max_workers,
+            progress_hook=lambda n, d: job._on_progress(indexes[n], d),
+            on_complete=lambda n, result: job._on_complete(indexes[n], result),
+            as_file=True,
+            connections=job.connections,
+            bandwidth_group=job.id,
+            audio_only=job.audio_only,
+            clip=job.clip
+        )
+
+    def _on_events(self, events: List[ProgressEvent]) -> None:
+        for event in events:
+            job = self.get(event.source)
+            if not job:
+                continue
+            previous = job.progress.get(event.index)
+            if event.stage == DONE:
+                # The finished output's size is the item's final size, whatever the
+                # last sample said (e.g. a merge or a remux changed it)
+                job.progress[event.index] = dict(event.to_dict(), total_bytes=event.downloaded_bytes)
+            elif event.stage == ERROR:
+                # Keep the bytes reached so far; a retry's events replace them
+                progress = event.to_dict()
+                if previous:
+                    progress.update(downloaded_bytes=previous.get('downloaded_bytes', 0),
+                                    total_bytes=previous.get('total_bytes'))
+                job.progress[event.index] = progress
+            elif event.stage in (DOWNLOADING, FINISHED):
+                # A late chunk callback must not reopen a finished item
+                if previous and previous.get('stage') == DONE:
+                    continue
+                job.progress[event.index] = event.to_dict()
+
+    def get(self, job_id: Optional[str]) -> Optional[DownloadJob]:
+        """Return the job with the given ID, or None if unknown or pruned"""
+        if not job_id:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job:
+            job.cancel()
+
+    def prune(self) -> None:
+        """Drop finished jobs older than the TTL and delete their files"""
+        now = time.time()
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job.is_done and job.finished_at and now - job.finished_at > self.job_ttl
+            ]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            job.close()
+
+
+class PlaylistLoader:
+    """Enumerates a playlist on a background thread
+
+    Entries are appended to ``entries`` as the downloader yields them, so a
+    UI can show, and let users select, the first entries while later pages
+    are still being fetched.
+
+    Args:
+        downloader (BaseDownloader): Downloader for the playlist URL
+        url (str): Playlist URL
+        start (int): Index of the first entry to load
+        limit (int, optional): Maximum number of entries to load
+    """
+
+    def __init__(self, downloader: BaseDownloader, url: str, start: int = 0, limit: Optional[int] = None):
+        self.url = url
+        self.entries: List[PlaylistEntry] = []
+        self.error: Optional[str] = None
+        self.is_done = False
+        self._cancelled = False
+        self._thread = threading.Thread(
+            target=self._run, args=(downloader, start, limit), name='playlist-loader', daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, downloader: BaseDownloader, start: int, limit: Optional[int]) -> None:
+        entries = downloader.iter_playlist_videos(self.url, start, limit)
+        try:
+            for entry in entries:
+                if self._cancelled:
+                    break
+                self.entries.append(entry)
+        except Exception as e:
+            print(f"Playlist error: {str(e)}")
+            self.error = str(e)
+        finally:
+            entries.close()
+            self.is_done = True
+
+    def cancel(self) -> None:
+        """Stop loading after the current entry"""
+        self._cancelled = True
+
+
+# Process-wide job manager shared by every Streamlit session
+job_manager = JobManager()
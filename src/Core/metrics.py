@@ -0,0 +1,299 @@
+"""
+Download metrics
+
+Per-stage timings, counters and structured logs for downloads and jobs.
+
+Metrics live in an in-process registry and are rendered in the Prometheus
+text format, either by ``render_prometheus()`` or by the exporter started
+with ``start_exporter()``. Every recorded stage is also logged as a JSON
+line on the ``downloader`` logger once ``configure_logging()`` was called.
+"""
+
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Histogram buckets for durations in seconds
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Histogram buckets for throughput in bytes per second
+THROUGHPUT_BUCKETS = tuple(2 ** n * 1024 for n in range(4, 18, 2))
+
+METRIC_PREFIX = 'ytdl_'
+
+logger = logging.getLogger('downloader')
+# Silent until configure_logging() is called; errors are printed where they occur
+logger.addHandler(logging.NullHandler())
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = ','.join(
+        '{}="{}"'.format(key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + escaped + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms keyed by name and labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._collectors: List[Callable[[], List[Tuple[str, str, str, Dict[str, Any], float]]]] = []
+
+    def _declare(self, name: str, kind: str, help_text: str) -> None:
+        if name not in self._help:
+            self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1, help_text: str = '', **labels) -> None:
+        """Increase a counter"""
+        with self._lock:
+            self._declare(name, 'counter', help_text)
+            series = self._counters.setdefault(name, {})
+            key = _labels(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, help_text: str = '', **labels) -> None:
+        """Set a gauge"""
+        with self._lock:
+            self._declare(name, 'gauge', help_text)
+            self._gauges.setdefault(name, {})[_labels(labels)] = value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = TIME_BUCKETS, help_text: str = '', **labels) -> None:
+        """Record a value in a histogram"""
+        with self._lock:
+            self._declare(name, 'histogram', help_text)
+            series = self._histograms.setdefault(name, {})
+            key = _labels(labels)
+            if key not in series:
+                series[key] = _Histogram(buckets)
+            series[key].observe(value)
+
+    def register_collector(self, collector: Callable[[], List[Tuple[str, str, str, Dict[str, Any], float]]]) -> None:
+        """Register a callable read at render time
+
+        The collector returns ``(name, kind, help, labels, value)`` tuples, for
+        values that other components already track (cache hit counters, ...).
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def value(self, name: str, **labels) -> Optional[float]:
+        """Current value of a counter or gauge, or the observation count of a histogram"""
+        key = _labels(labels)
+        with self._lock:
+            if key in self._counters.get(name, {}):
+                return self._counters[name][key]
+            if key in self._gauges.get(name, {}):
+                return self._gauges[name][key]
+            if key in self._histograms.get(name, {}):
+                return self._histograms[name][key].count
+        return None
+
+    def render_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        with self._lock:
+            help_map = dict(self._help)
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+            histograms = {
+                name: {key: (h.buckets, list(h.counts), h.count, h.sum) for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+            collectors = list(self._collectors)
+
+        for collector in collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                print(f"Metrics collector error: {str(e)}")
+                continue
+            for name, kind, help_text, labels, value in samples:
+                help_map.setdefault(name, (kind, help_text))
+                (counters if kind == 'counter' else gauges).setdefault(name, {})[_labels(labels)] = value
+
+        lines = []
+        for name in sorted(help_map):
+            kind, help_text = help_map[name]
+            full_name = METRIC_PREFIX + name
+            if help_text:
+                lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            if kind == 'histogram':
+                for key, (buckets, counts, count, total) in sorted(histograms.get(name, {}).items()):
+                    for bound, bucket_count in zip(buckets, counts):
+                        lines.append(f"{full_name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {bucket_count}")
+                    lines.append(f"{full_name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {_format_value(total)}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {count}")
+            else:
+                series = (counters if kind == 'counter' else gauges).get(name, {})
+                for key, value in sorted(series.items()):
+                    lines.append(f"{full_name}{_format_labels(key)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry
+metrics = MetricsRegistry()
+
+
+def register_stats(
+    name: str,
+    stats: Callable[[], Dict[str, Any]],
+    counters: Sequence[str] = (),
+    gauges: Sequence[str] = (),
+) -> None:
+    """Export entries of a component's stats() dict
+
+    Counters are exported as ``<name>_<key>_total`` and gauges as ``<name>_<key>``.
+    """
+    def collect():
+        values = stats()
+        return (
+            [(f"{name}_{key}_total", 'counter', f"{name} {key}", {}, values[key]) for key in counters if key in values]
+            + [(f"{name}_{key}", 'gauge', f"{name} {key}", {}, values[key]) for key in gauges if key in values]
+        )
+    metrics.register_collector(collect)
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(stream=None, level: int = logging.INFO) -> None:
+    """Write the downloader's structured logs as JSON lines (stderr by default)
+
+    Safe to call repeatedly, e.g. on every Streamlit rerun.
+    """
+    if any(getattr(handler, '_downloader_json', False) for handler in logger.handlers):
+        return
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(_JsonFormatter())
+    handler._downloader_json = True
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def log_event(event: str, level: int = logging.INFO, **fields) -> None:
+    """Log a structured event"""
+    logger.log(level, event, extra={'fields': fields})
+
+
+def record_stage(stage: str, seconds: float, **fields) -> None:
+    """Record how long a stage took, as a histogram sample and a log line"""
+    metrics.observe('stage_seconds', seconds, help_text='Time spent per download stage', stage=stage)
+    log_event('stage', stage=stage, seconds=round(seconds, 4), **fields)
+
+
+def record_error(stage: str, error: Any, **fields) -> None:
+    """Count an error of a stage and log it"""
+    metrics.inc('errors_total', help_text='Errors per download stage', stage=stage)
+    log_event('error', level=logging.ERROR, stage=stage, error=str(error), **fields)
+
+
+@contextmanager
+def timed(stage: str, **fields) -> Iterator[Dict[str, Any]]:
+    """Time the block as a stage
+
+    Yields a dict whose entries are added to the log line. Errors raised in
+    the block are counted for the stage and re-raised.
+    """
+    extra: Dict[str, Any] = {}
+    started = time.perf_counter()
+    try:
+        yield extra
+    except Exception as e:
+        record_error(stage, e, **fields)
+        raise
+    finally:
+        # Entries set in the block win over the fields given up front
+        record_stage(stage, time.perf_counter() - started, **{**fields, **extra})
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = metrics.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_exporter: Optional[ThreadingHTTPServer] = None
+_exporter_lock = threading.Lock()
+
+
+def start_exporter(port: int, host: str = '127.0.0.1') -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics for Prometheus on a background thread (once per process)
+
+    The endpoint is unauthenticated and names jobs, so it only listens on
+    loopback unless another interface is given.
+
+    Returns:
+        ThreadingHTTPServer: The exporter, or None if it could not be started
+    """
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            try:
+                _exporter = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                print(f"Could not start metrics exporter on port {port}: {str(e)}")
+                return None
+            _exporter.daemon_threads = True
+            threading.Thread(target=_exporter.serve_forever, name='metrics-exporter', daemon=True).start()
+        return _exporter
@@ -0,0 +1,179 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+# Instances are closed and replaced after this many borrows
+DEFAULT_MAX_USES = 50
+
+# Idle instances kept per profile; extra returned instances are closed
+DEFAULT_MAX_IDLE = 4
+
+_MISSING = object()
+
+
+class _PooledInstance:
+    """A YoutubeDL instance plus the per-borrow state the pool swaps in and out"""
+
+    def __init__(self, ydl):
+        self.ydl = ydl
+        self.uses = 0
+        self.hooks: List[Callable[[dict], None]] = []
+
+    def dispatch_progress(self, d: dict) -> None:
+        # Registered once as the instance's only progress hook; forwards to
+        # the hooks of whoever is currently borrowing it
+        for hook in list(self.hooks):
+            hook(d)
+
+
+class YoutubeDLPool:
+    """Thread-safe pool of pre-built YoutubeDL instances, grouped by option profile
+
+    Reusing an instance keeps its initialized extractors, cookie jar and
+    HTTP keep-alive connections. Options that differ per call (format,
+    output template, progress hooks, ...) are applied for the duration of a
+    borrow and restored afterwards.
+
+    Args:
+        profiles (dict): Profile name -> base YoutubeDL options
+        max_uses (int): Borrows before an instance is recycled
+        max_idle (int): Idle instances kept per profile
+    """
+
+    def __init__(self, profiles: Dict[str, Dict[str, Any]], max_uses: int = DEFAULT_MAX_USES, max_idle: int = DEFAULT_MAX_IDLE):
+        self.profiles = profiles
+        self.max_uses = max_uses
+        self.max_idle = max_idle
+        self._idle: Dict[str, Deque[_PooledInstance]] = {name: deque() for name in profiles}
+        self._lock = threading.Lock()
+        self._warmer: Optional[threading.Thread] = None
+        self.created = 0
+        self.reused = 0
+
+    def _create(self, profile: str) -> _PooledInstance:
+        # Imported here so building the pool doesn't load yt-dlp
+        from .segmented import SegmentedYoutubeDL
+
+        pooled = _PooledInstance(None)
+        params = dict(self.profiles[profile], progress_hooks=[pooled.dispatch_progress])
+        pooled.ydl = SegmentedYoutubeDL(params)
+        with self._lock:
+            self.created += 1
+        return pooled
+
+    def _acquire(self, profile: str) -> _PooledInstance:
+        with self._lock:
+            idle = self._idle[profile]
+            if idle:
+                self.reused += 1
+                return idle.pop()
+        return self._create(profile)
+
+    def _release(self, profile: str, pooled: _PooledInstance, healthy: bool) -> None:
+        pooled.uses += 1
+        if healthy and pooled.uses < self.max_uses:
+            with self._lock:
+                if len(self._idle[profile]) < self.max_idle:
+                    self._idle[profile].append(pooled)
+                    return
+        pooled.ydl.close()
+
+    def warm(self, profiles: Optional[List[str]] = None) -> threading.Thread:
+        """Build one idle instance per profile on a background thread (once)
+
+        Lets the first request of each profile skip YoutubeDL construction,
+        without making whoever starts the pool wait for it.
+
+        Args:
+            profiles (list, optional): Profiles to warm, all by default
+
+        Returns:
+            threading.Thread: The warming thread
+        """
+        with self._lock:
+            if self._warmer is None:
+                self._warmer = threading.Thread(target=self._warm, args=(profiles or list(self.profiles),),
+                                                name='ydl-pool-warmer', daemon=True)
+                self._warmer.start()
+            return self._warmer
+
+    def _warm(self, profiles: List[str]) -> None:
+        for profile in profiles:
+            with self._lock:
+                if self._idle[profile]:
+                    continue
+            try:
+                pooled = self._create(profile)
+            except Exception as e:
+                print(f"Error warming {profile} YoutubeDL: {str(e)}")
+                continue
+            with self._lock:
+                self._idle[profile].append(pooled)
+
+    @contextmanager
+    def borrow(self, profile: str, progress_hook: Optional[Callable[[dict], None]] = None, **overrides) -> Iterator[Any]:
+        """Borrow an instance of profile with per-call option overrides
+
+        Args:
+            profile (str): Profile name
+            progress_hook (callable, optional): Progress hook for this borrow only
+            **overrides: YoutubeDL options for this borrow only
+
+        Yields:
+            YoutubeDL: The instance; don't keep it after the block
+        """
+        pooled = self._acquire(profile)
+        ydl = pooled.ydl
+        saved = {key: ydl.params.get(key, _MISSING) for key in overrides}
+        healthy = False
+        try:
+            self._apply(ydl, overrides)
+            if progress_hook:
+                pooled.hooks.append(progress_hook)
+            yield ydl
+            healthy = True
+        except GeneratorExit:
+            # A generator borrowing the instance was closed early by its consumer
+            healthy = True
+            raise
+        finally:
+            pooled.hooks.clear()
+            try:
+                self._apply(ydl, {key: value for key, value in saved.items() if value is not _MISSING})
+                for key, value in saved.items():
+                    if value is _MISSING:
+                        ydl.params.pop(key, None)
+                if 'format' in saved and saved['format'] is _MISSING:
+                    ydl.format_selector = None
+            except Exception:
+                healthy = False
+            # Instances that raised may be in an odd state, so they're not reused
+            self._release(profile, pooled, healthy)
+
+    @staticmethod
+    def _apply(ydl, options: Dict[str, Any]) -> None:
+        """Set options on a live instance, including the ones YoutubeDL preprocesses in __init__"""
+        ydl.params.update(options)
+        if 'outtmpl' in options:
+            ydl._parse_outtmpl()
+        if 'format' in options:
+            fmt = options['format']
+            ydl.format_selector = fmt if fmt in (None, '-') or callable(fmt) else ydl.build_format_selector(fmt)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'created': self.created,
+                'reused': self.reused,
+                'idle': {name: len(idle) for name, idle in self._idle.items()},
+            }
+
+    def close(self) -> None:
+        """Close every idle instance"""
+        with self._lock:
+            idle = [pooled for instances in self._idle.values() for pooled in instances]
+            for instances in self._idle.values():
+                instances.clear()
+        for pooled in idle:
+            pooled.ydl.close()
@@ -0,0 +1,90 @@
+import threading
+from importlib import import_module
+from typing import Any, Dict, Optional, Type
+from urllib.parse import urlsplit
+
+from .base import BaseDownloader
+
+
+class DownloaderRegistry:
+    """Lazily-loaded, singleton downloader instances with host-based URL dispatch
+
+    Each spec maps a backend name to its import path (``"module:Class"``)
+    and the hosts it serves. Hosts go into a dict for O(1) lookups in the
+    common case. The backend's own ``supports_url`` has the final say, both
+    for a host match and, for URLs on other hosts, when the backends are
+    tried in turn. Backends are only imported once a URL reaches them, and
+    then reused for every later call.
+    """
+
+    def __init__(self, specs: Dict[str, Dict[str, Any]]):
+        self.specs = specs
+        self._hosts: Dict[str, str] = {}
+        for name, spec in specs.items():
+            for host in spec.get('hosts', []):
+                self._hosts[host.lower()] = name
+
+        self._classes: Dict[str, Type[BaseDownloader]] = {}
+        self._instances: Dict[str, BaseDownloader] = {}
+        self._lock = threading.Lock()
+        self._warmer: Optional[threading.Thread] = None
+
+    def get_class(self, name: str) -> Type[BaseDownloader]:
+        """Import the downloader registered under name (once) and return its class"""
+        downloader_class = self._classes.get(name)
+        if downloader_class is None:
+            module_path, class_name = self.specs[name]['path'].split(':')
+            downloader_class = getattr(import_module(module_path), class_name)
+            self._classes[name] = downloader_class
+        return downloader_class
+
+    def get(self, name: str) -> BaseDownloader:
+        """Return the shared instance of the downloader registered under name"""
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = self.get_class(name)()
+                    self._instances[name] = instance
+        return instance
+
+    def warm_up(self) -> threading.Thread:
+        """Import every backend and warm it up on a background thread (once)
+
+        Keeps the app's first render free of backend imports while sparing
+        the first request their cost.
+        """
+        with self._lock:
+            if self._warmer is None:
+                self._warmer = threading.Thread(target=self._warm_up, name='downloader-warmer', daemon=True)
+                self._warmer.start()
+            return self._warmer
+
+    def _warm_up(self) -> None:
+        for name in self.specs:
+            try:
+                self.get(name).warm_up()
+            except Exception as e:
+                print(f"Error warming up {name} downloader: {str(e)}")
+
+    def match(self, url: str) -> Optional[str]:
+        """Return the name of the backend serving url, or None"""
+        if not url:
+            return None
+
+        # Fast path: exact host lookup, confirmed by the backend
+        host = urlsplit(url if '://' in url else f"https://{url}").hostname
+        name = self._hosts.get(host or '')
+        if name:
+            return name if self.get(name).supports_url(url) else None
+
+        for name in self.specs:
+            if self.get(name).supports_url(url):
+                return name
+        return None
+
+    def resolve(self, url: str) -> Optional[BaseDownloader]:
+        """Return the downloader instance for url, or None if no backend supports it"""
+        name = self.match(url)
+        return self.get(name) if name else None
@@ -0,0 +1,336 @@
+"""
+Segmented downloads
+
+Splits a single HTTP resource into byte ranges and fetches them concurrently
+over several connections. Each connection streams its range straight to its
+offset in the output file, so memory use is bounded by the number of
+connections times the read block size, not by the size of the file.
+
+Completed segments can be recorded in a state file, so an interrupted
+download resumes from the last completed segment.
+
+Inside yt-dlp (``SegmentedFD``) every request goes through the YoutubeDL's
+own networking, so proxies, cookies, impersonation and the format's
+headers apply exactly as they do to yt-dlp's downloaders.
+"""
+
+import json
+import math
+import os
+import re
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import yt_dlp
+from yt_dlp.downloader.common import FileDownloader
+from yt_dlp.networking import Request
+from yt_dlp.utils.networking import HTTPHeaderDict
+
+DEFAULT_SEGMENT_SIZE = 4 * 1024 * 1024
+DEFAULT_BLOCK_SIZE = 64 * 1024
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+
+# Files smaller than this are not worth splitting
+MIN_SEGMENTED_SIZE = 2 * 1024 * 1024
+
+# Minimum delay between two progress callbacks
+PROGRESS_INTERVAL = 0.2
+
+
+class SegmentedDownloader:
+    """Fetch a URL over several concurrent range requests
+
+    Args:
+        connections (int): Number of concurrent connections
+        segment_size (int): Size of each byte range in bytes
+        block_size (int): Read size per connection, which bounds memory use
+        timeout (float): Socket timeout per request in seconds
+        retries (int): Retries per segment; a retry resumes where the segment stopped
+        throttle (callable, optional): Called with the size of every block read, from
+            the connection that read it; it may sleep to cap the download rate
+        urlopen (callable, optional): Called as ``urlopen(url, headers, timeout)`` to open a
+            request and return a file-like response with ``status`` and ``headers``;
+            plain urllib by default
+    """
+
+    def __init__(
+        self,
+        connections: int = 4,
+        segment_size: int = DEFAULT_SEGMENT_SIZE,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        throttle: Optional[Callable[[int], None]] = None,
+        urlopen: Optional[Callable[[str, Dict[str, str], float], Any]] = None,
+    ):
+        self.connections = max(1, connections)
+        self.segment_size = segment_size
+        self.block_size = block_size
+        self.timeout = timeout
+        self.retries = retries
+        self.throttle = throttle
+        self.urlopen = urlopen
+
+    def _open(self, url: str, headers: Dict[str, str], byte_range: Optional[Tuple[int, int]] = None):
+        request_headers = dict(headers)
+        if byte_range is not None:
+            request_headers['Range'] = f"bytes={byte_range[0]}-{byte_range[1]}"
+        if self.urlopen is not None:
+            return self.urlopen(url, request_headers, self.timeout)
+        return urllib.request.urlopen(urllib.request.Request(url, headers=request_headers), timeout=self.timeout)
+
+    def probe(self, url: str, headers: Optional[Dict[str, str]] = None) -> Tuple[Optional[int], bool]:
+        """Return (total size, whether the server honours range requests)"""
+        with self._open(url, headers or {}, (0, 0)) as response:
+            if response.status == 206:
+                match = re.match(r'bytes 0-0/(\d+)', response.headers.get('Content-Range', ''))
+                if match:
+                    return int(match.group(1)), True
+            length = response.headers.get('Content-Length')
+            return (int(length) if length else None), False
+
+    def split(self, total_size: int) -> List[Tuple[int, int]]:
+        """Split a size into inclusive (start, end) byte ranges"""
+        count = max(1, math.ceil(total_size / self.segment_size))
+        return [
+            (i * self.segment_size, min((i + 1) * self.segment_size, total_size) - 1)
+            for i in range(count)
+        ]
+
+    def fetch(
+        self,
+        url: str,
+        dest_path: str,
+        headers: Optional[Dict[str, str]] = None,
+        total_size: Optional[int] = None,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None,
+        state_path: Optional[str] = None,
+    ) -> int:
+        """Download url to dest_path
+
+        Falls back to a single connection when the server doesn't support
+        ranges or the file is too small to be worth splitting.
+
+        Args:
+            url (str): Resource URL
+            dest_path (str): Output file, created or truncated
+            headers (dict, optional): Extra request headers
+            total_size (int, optional): Known size, skips nothing but the sanity check
+            progress (callable, optional): Called as ``progress(downloaded_bytes, total_bytes)``
+            state_path (str, optional): File recording completed segments. When it matches
+                an existing dest_path, only the missing segments are fetched
+
+        Returns:
+            int: Number of bytes written
+        """
+        headers = headers or {}
+        probed_size, ranges_supported = self.probe(url, headers)
+        total_size = probed_size or total_size
+
+        tracker = _ProgressTracker(total_size, progress)
+        if not ranges_supported or not total_size or total_size < MIN_SEGMENTED_SIZE or self.connections == 1:
+            return self._fetch_single(url, dest_path, headers, tracker)
+
+        segments = self.split(total_size)
+        done = self._load_state(state_path, total_size) if state_path else set()
+        if not done or not os.path.exists(dest_path) or os.path.getsize(dest_path) != total_size:
+            done = set()
+            # Preallocate so every connection can write at its own offset
+            with open(dest_path, 'wb') as f:
+                f.truncate(total_size)
+
+        pending = [segment for segment in segments if segment[0] not in done]
+        tracker.add(total_size - sum(end - start + 1 for start, end in pending))
+        state_lock = threading.Lock()
+
+        def run(segment):
+            self._fetch_segment(url, dest_path, headers, segment, tracker)
+            if state_path:
+                with state_lock:
+                    done.add(segment[0])
+                    self._save_state(state_path, total_size, done)
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.connections, len(pending))) as executor:
+                for future in [executor.submit(run, segment) for segment in pending]:
+                    future.result()
+
+        if state_path and os.path.exists(state_path):
+            os.unlink(state_path)
+        tracker.report(force=True)
+        return total_size
+
+    def _load_state(self, state_path: str, total_size: int) -> set:
+        """Return the start offsets of completed segments, if the state matches this download"""
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if state.get('total_size') != total_size or state.get('segment_size') != self.segment_size:
+            return set()
+        return set(state.get('done', []))
+
+    def _save_state(self, state_path: str, total_size: int, done: set) -> None:
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'total_size': total_size, 'segment_size': self.segment_size, 'done': sorted(done)}, f)
+        os.replace(tmp_path, state_path)
+
+    def _fetch_single(self, url: str, dest_path: str, headers: Dict[str, str], tracker: "_ProgressTracker") -> int:
+        written = 0
+        with self._open(url, headers) as response, open(dest_path, 'wb') as f:
+            while True:
+                block = response.read(self.block_size)
+                if not block:
+                    break
+                f.write(block)
+                written += len(block)
+                tracker.add(len(block))
+                if self.throttle:
+                    self.throttle(len(block))
+        tracker.report(force=True)
+        return written
+
+    def _fetch_segment(self, url: str, dest_path: str, headers: Dict[str, str], segment: Tuple[int, int], tracker: "_ProgressTracker") -> None:
+        start, end = segment
+        position = start
+        attempt = 0
+        with open(dest_path, 'r+b') as f:
+            while position <= end:
+                try:
+                    with self._open(url, headers, (position, end)) as response:
+                        if response.status != 206:
+                            raise IOError(f"Server ignored range request (HTTP {response.status})")
+                        f.seek(position)
+                        while position <= end:
+                            block = response.read(min(self.block_size, end - position + 1))
+                            if not block:
+                                break
+                            f.write(block)
+                            position += len(block)
+                            tracker.add(len(block))
+                            if self.throttle:
+                                self.throttle(len(block))
+                    if position <= end:
+                        raise IOError(f"Connection closed at byte {position} of segment {start}-{end}")
+                except Exception:
+                    attempt += 1
+                    if attempt > self.retries:
+                        raise
+                    time.sleep(min(2 ** attempt, 10) * 0.1)
+
+
+class _ProgressTracker:
+    """Thread-safe byte counter that rate-limits progress callbacks"""
+
+    def __init__(self, total: Optional[int], callback: Optional[Callable[[int, Optional[int]], None]]):
+        self.total = total
+        self.callback = callback
+        self.downloaded = 0
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, count: int) -> None:
+        with self._lock:
+            self.downloaded += count
+        self.report()
+
+    def report(self, force: bool = False) -> None:
+        if not self.callback:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_report < PROGRESS_INTERVAL:
+                return
+            self._last_report = now
+            downloaded = self.downloaded
+        self.callback(downloaded, self.total)
+
+
+class SegmentedFD(FileDownloader):
+    """yt-dlp file downloader backed by SegmentedDownloader"""
+
+    FD_NAME = 'segmented'
+
+    def real_download(self, filename, info_dict):
+        tmpfilename = self.temp_name(filename)
+        started = time.time()
+
+        def progress(downloaded, total):
+            elapsed = time.time() - started
+            speed = downloaded / elapsed if elapsed > 0 else None
+            self._hook_progress({
+                'status': 'downloading',
+                # Blocks were already throttled as they were read (see bandwidth.py)
+                'throttled': True,
+                'downloaded_bytes': downloaded,
+                'total_bytes': total,
+                'filename': filename,
+                'tmpfilename': tmpfilename,
+                'elapsed': elapsed,
+                'speed': speed,
+                'eta': (total - downloaded) / speed if speed and total else None,
+            }, info_dict)
+
+        # Requests go through the YoutubeDL (proxy, cookies, source address), like HttpFD's
+        extensions = {}
+        impersonate_target = self._get_impersonate_target(info_dict)
+        if impersonate_target is not None:
+            extensions['impersonate'] = impersonate_target
+
+        def urlopen(url, headers, timeout):
+            return self.ydl.urlopen(Request(url, headers=headers, extensions=dict(extensions, timeout=timeout)))
+
+        fetcher = SegmentedDownloader(
+            connections=self.params.get('segmented_connections', 4),
+            throttle=self.params.get('bandwidth_throttle'),
+            urlopen=urlopen
+        )
+        size = fetcher.fetch(
+            info_dict['url'],
+            tmpfilename,
+            # Ranges are byte offsets, so the response must not be compressed
+            headers=dict(HTTPHeaderDict({'Accept-Encoding': 'identity'}, info_dict.get('http_headers'))),
+            total_size=info_dict.get('filesize'),
+            progress=progress,
+            # Resume from the completed segments of an earlier attempt
+            state_path=f"{tmpfilename}.segments" if self.params.get('continuedl', True) else None
+        )
+
+        self.try_rename(tmpfilename, filename)
+        self._hook_progress({
+            'status': 'finished',
+            'throttled': True,
+            'downloaded_bytes': size,
+            'total_bytes': size,
+            'filename': filename,
+            'elapsed': time.time() - started,
+        }, info_dict)
+        return True
+
+
+class SegmentedYoutubeDL(yt_dlp.YoutubeDL):
+    """YoutubeDL that fetches plain HTTP formats with SegmentedFD
+
+    Enabled by setting the ``segmented_connections`` option above 1. Other
+    protocols (DASH, HLS) keep yt-dlp's downloaders, which fetch fragments
+    concurrently according to ``concurrent_fragment_downloads``.
+    """
+
+    def dl(self, name, info, subtitle=False, test=False):
+        connections = self.params.get('segmented_connections') or 1
+        if test or subtitle or connections <= 1 or name == '-' or info.get('protocol') not in ('http', 'https'):
+            return super().dl(name, info, subtitle=subtitle, test=test)
+
+        fd = SegmentedFD(self, self.params)
+        for ph in self._progress_hooks:
+            fd.add_progress_hook(ph)
+        new_info = self._copy_infodict(info)
+        if new_info.get('http_headers') is None:
+            new_info['http_headers'] = self._calc_headers(new_info)
+        return fd.download(name, new_info, subtitle)
@@ -0,0 +1,189 @@
+"""
+Single-flight calls
+
+Concurrent calls for the same key share one execution: the first caller
+runs the function and callers arriving while it runs attach to it instead
+of starting their own, then all of them receive its result (or its error).
+Progress the running call reports is forwarded to the hook of every
+attached caller, so each sees the shared download as if it were its own.
+
+Once a call has finished, the next caller for its key starts a new one;
+results are not kept (that is what the caches are for).
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional
+
+ProgressHook = Callable[[dict], None]
+
+
+class _Call:
+    """One running execution and the callers attached to it"""
+
+    def __init__(self, flight: "SingleFlight", key: Hashable):
+        self.flight = flight
+        self.key = key
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.finished = False
+        # Callers inside join(); the result is released when the last one leaves
+        self.attached = 0
+        # Callers whose progress hook hasn't raised (e.g. cancelled)
+        self.interested = 0
+        self.hooks: Dict[int, ProgressHook] = {}
+        self.failures: Dict[int, BaseException] = {}
+        self.last_progress: Optional[dict] = None
+        self._tokens = 0
+        self._cond = threading.Condition()
+
+    def attach(self, hook: Optional[ProgressHook]) -> int:
+        with self._cond:
+            self._tokens += 1
+            token = self._tokens
+            self.attached += 1
+            self.interested += 1
+            if hook is not None:
+                self.hooks[token] = hook
+            return token
+
+    def catch_up(self, token: int, hook: ProgressHook) -> None:
+        """Give a late caller the latest progress it missed"""
+        last = self.last_progress
+        if last is None:
+            return
+        try:
+            self._deliver(token, hook, last)
+        except BaseException:
+            # Only the caller is detached; the call keeps running for the others
+            pass
+
+    def dispatch(self, d: dict) -> None:
+        """Progress hook of the running call, fanning out to every attached caller"""
+        with self._cond:
+            self.last_progress = d
+            hooks = list(self.hooks.items())
+        for token, hook in hooks:
+            self._deliver(token, hook, d)
+
+    def _deliver(self, token: int, hook: ProgressHook, d: dict) -> None:
+        try:
+            hook(d)
+        except BaseException as e:
+            # A caller that gives up (its hook raised) is detached and gets its own
+            # error back; the call only stops when no caller is left waiting for it
+            with self._cond:
+                if self.hooks.pop(token, None) is None:
+                    return
+                self.failures[token] = e
+                self.interested -= 1
+                abandoned = self.interested <= 0
+                self._cond.notify_all()
+            if abandoned:
+                self.flight._forget(self)
+                raise
+
+    def wait(self, token: int) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: self.finished or token in self.failures)
+
+    def finish(self, result: Any, error: Optional[BaseException]) -> None:
+        with self._cond:
+            self.result = result
+            self.error = error
+            self.finished = True
+            self._cond.notify_all()
+
+    def leave(self, token: int) -> bool:
+        """Detach a caller; returns True if it was the last one of a successful call"""
+        with self._cond:
+            self.hooks.pop(token, None)
+            self.attached -= 1
+            return self.attached == 0 and self.finished and self.error is None
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls by key
+
+    Args:
+        release (callable, optional): Called with a successful result once every
+            caller has left ``join``, e.g. to remove a file the callers copied
+    """
+
+    def __init__(self, release: Optional[Callable[[Any], None]] = None):
+        self.release = release
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.shared = 0
+
+    def _forget(self, call: _Call) -> None:
+        # Callers arriving after this start a new call
+        with self._lock:
+            if self._calls.get(call.key) is call:
+                del self._calls[call.key]
+
+    @contextmanager
+    def join(self, key: Hashable, fn: Callable[[ProgressHook], Any], progress_hook: Optional[ProgressHook] = None) -> Iterator[Any]:
+        """Run fn once for all concurrent callers of key and yield its result
+
+        The first caller runs ``fn(hook)`` in its own thread; ``hook`` forwards
+        progress to the ``progress_hook`` of every attached caller. Errors raised
+        by fn are re-raised to all of them. A caller whose progress hook raises
+        (e.g. a cancelled job) gets that error instead, straight away if it is
+        only waiting; fn itself is only interrupted once every caller gave up.
+
+        Callers may use the result for the duration of the block; ``release``
+        runs after the last of them left it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call(self, key)
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.shared += 1
+            # Attach before the lock is released, so a finishing call can't be missed
+            token = call.attach(progress_hook)
+        if progress_hook is not None and not leader:
+            call.catch_up(token, progress_hook)
+
+        try:
+            if leader:
+                result, error = None, None
+                try:
+                    result = fn(call.dispatch)
+                except BaseException as e:
+                    error = e
+                finally:
+                    self._forget(call)
+                    call.finish(result, error)
+            else:
+                call.wait(token)
+
+            error = call.failures.get(token) or call.error
+            if error is not None:
+                raise error
+            yield call.result
+        finally:
+            if call.leave(token) and self.release is not None:
+                try:
+                    self.release(call.result)
+                except Exception as e:
+                    print(f"Error releasing shared result: {str(e)}")
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn once for all concurrent callers of key and return its result"""
+        with self.join(key, lambda _hook: fn()) as result:
+            return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            'executed': self.executed,
+            'shared': self.shared,
+            'in_flight': in_flight,
+        }
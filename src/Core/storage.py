@@ -0,0 +1,280 @@
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .metrics import register_stats
+
+# Default location and size budget of the on-disk download cache
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'download_cache')
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024 * 1024
+
+# Work directories older than this are left over from a crashed process
+STALE_WORK_DIR_AGE = 24 * 60 * 60
+
+# Access times updated by cache hits are written to the index at most this often
+# (in seconds); adding or evicting a file writes it straight away
+INDEX_SAVE_INTERVAL = 30.0
+
+
+class DownloadCache:
+    """Persistent, size-bounded cache of finished downloads
+
+    Files are keyed by (video id, format ids, postprocessing profile) and
+    evicted least-recently-used first once ``max_bytes`` is exceeded. The
+    index is stored next to the files so the cache survives restarts. All
+    writes go through a temporary name followed by ``os.replace``. Hits only
+    mark the index dirty; a crash loses at most ``INDEX_SAVE_INTERVAL``
+    seconds of access times, which only affects the eviction order.
+    """
+
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.files_dir = os.path.join(root, 'files')
+        self.work_root = os.path.join(root, 'work')
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False
+        self._last_save = 0.0
+        # Keys of downloads currently using their stable work directory
+        self._active_work = set()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(video_id: str, format_id: str, profile: str) -> str:
+        """Build a cache key from the video, the exact formats and the postprocessing profile"""
+        return hashlib.sha1(f"{video_id}|{format_id}|{profile}".encode('utf-8')).hexdigest()
+
+    def _load(self) -> None:
+        """Load the index from disk, dropping entries whose files are gone (lock held)"""
+        if self._loaded:
+            return
+        os.makedirs(self.files_dir, exist_ok=True)
+        os.makedirs(self.work_root, exist_ok=True)
+
+        index_path = os.path.join(self.root, self.INDEX_FILE)
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+
+        self._index = {
+            key: entry for key, entry in index.items()
+            if os.path.exists(os.path.join(self.files_dir, entry.get('filename', '')))
+        }
+        self._remove_stale_work_dirs()
+        self._loaded = True
+
+    def _remove_stale_work_dirs(self) -> None:
+        now = time.time()
+        for name in os.listdir(self.work_root):
+            path = os.path.join(self.work_root, name)
+            try:
+                if now - os.path.getmtime(path) > STALE_WORK_DIR_AGE:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+    def _save(self) -> None:
+        """Write the index atomically (lock held)"""
+        self._dirty = False
+        self._last_save = time.monotonic()
+        index_path = os.path.join(self.root, self.INDEX_FILE)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.index-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def make_work_dir(self) -> str:
+        """Create a work directory on the same filesystem as the cache, so files can be hard-linked"""
+        with self._lock:
+            self._load()
+        return tempfile.mkdtemp(prefix='ytdl-', dir=self.work_root)
+
+    def copy_to_work_dir(self, path: str) -> str:
+        """Hard-link (or copy) a file into a new work directory and return the new path"""
+        work_dir = self.make_work_dir()
+        dest = os.path.join(work_dir, os.path.basename(path))
+        try:
+            _link_or_copy(path, dest)
+        except OSError:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        return dest
+
+    def _partial_dir(self, key: str) -> str:
+        return os.path.join(self.work_root, f"partial-{key}")
+
+    def acquire_work_dir(self, key: str) -> str:
+        """Return the stable work directory for a download, keeping earlier partial files
+
+        If the same download is already running in this process, a private
+        directory is returned instead so the two don't write the same files.
+        """
+        with self._lock:
+            self._load()
+            if key in self._active_work:
+                return tempfile.mkdtemp(prefix='ytdl-', dir=self.work_root)
+            self._active_work.add(key)
+        path = self._partial_dir(key)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def release_work_dir(self, key: str, path: str, keep_partial: bool = False) -> None:
+        """Release a directory from acquire_work_dir
+
+        Partial files are kept for a later retry when ``keep_partial`` is set;
+        they are swept with other stale work directories after a day.
+        """
+        stable = path == self._partial_dir(key)
+        if stable:
+            with self._lock:
+                self._active_work.discard(key)
+        if keep_partial and stable:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the index entry for key (with its absolute ``path``), or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._load()
+            entry = self._index.get(key)
+            path = os.path.join(self.files_dir, entry['filename']) if entry else None
+            if not entry or not os.path.exists(path):
+                if self._index.pop(key, None) is not None:
+                    self._dirty = True
+                self.misses += 1
+                return None
+
+            entry['last_access'] = time.time()
+            self._dirty = True
+            if time.monotonic() - self._last_save >= INDEX_SAVE_INTERVAL:
+                self._save()
+            self.hits += 1
+            return dict(entry, path=path)
+
+    def flush(self) -> None:
+        """Write access times recorded since the last save to the index"""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def materialize(self, key: str, dest_path: str) -> bool:
+        """Place a cached file at dest_path (hard link, or copy across filesystems)
+
+        The destination is independent of the cache entry, so eviction can't
+        remove a file that a caller is still using.
+        """
+        entry = self.get(key)
+        if not entry:
+            return False
+        try:
+            _link_or_copy(entry['path'], dest_path)
+            return True
+        except OSError:
+            return False
+
+    def put(self, key: str, src_path: str, meta: Optional[Dict[str, Any]] = None) -> bool:
+        """Add a finished file to the cache, leaving src_path in place
+
+        Returns:
+            bool: True if the file was stored
+        """
+        if not self.enabled:
+            return False
+        size = os.path.getsize(src_path)
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            self._load()
+            filename = f"{key}{os.path.splitext(src_path)[1]}"
+            final_path = os.path.join(self.files_dir, filename)
+            tmp_path = os.path.join(self.files_dir, f".{filename}.tmp")
+            try:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                _link_or_copy(src_path, tmp_path)
+                os.replace(tmp_path, final_path)
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                return False
+
+            now = time.time()
+            self._index[key] = {
+                'filename': filename,
+                'size': size,
+                'created': now,
+                'last_access': now,
+                'meta': meta or {},
+            }
+            self._evict(keep=key)
+            self._save()
+            return True
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Remove least recently used entries until the cache fits its budget (lock held)"""
+        total = sum(entry['size'] for entry in self._index.values())
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.unlink(os.path.join(self.files_dir, entry['filename']))
+            except OSError:
+                pass
+            del self._index[key]
+            total -= entry['size']
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._index),
+                'bytes': sum(entry['size'] for entry in self._index.values()),
+                'max_bytes': self.max_bytes,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _link_or_copy(src: str, dest: str) -> None:
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+# Process-wide cache shared by every downloader instance and Streamlit session
+download_cache = DownloadCache()
+atexit.register(download_cache.flush)
+register_stats('download_cache', download_cache.stats, counters=('hits', 'misses'), gauges=('entries', 'bytes', 'hit_rate'))
@@ -1,303 +1,722 @@
-from typing import List, Optional
+from typing import Iterator, List, Optional, Union
 import re
 import io
-import yt_dlp
-from .base import BaseDownloader, VideoInfo, DownloadResult
+import copy
+import itertools
+import os
+import shutil
+import time
+from .base import BaseDownloader, VideoInfo, DownloadResult, ResolvedVideo, PlaylistEntry
+from .formats import FormatChoice, FormatIndex
+from .cache import metadata_cache
+from .storage import download_cache
+from .pool import YoutubeDLPool
+from .bandwidth import bandwidth_manager
+from .metrics import THROUGHPUT_BUCKETS, metrics, record_error, record_stage, register_stats, timed
+from .singleflight import SingleFlight
+from src.ffmpeg.manager import get_ffmpeg_info
+from src.ffmpeg.clip import cut_clip, plan_clip
+from src.ffmpeg.postprocess import plan_audio_extraction, plan_postprocessing, remux
+
+# Base options of each pooled YoutubeDL profile; per-call options are applied on borrow
+YDL_PROFILES = {
+    'info': {
+        'quiet': True,
+    },
+    'playlist': {
+        'quiet': True,
+        'extract_flat': True,
+        'skip_download': True,
+    },
+    'download': {
+        'quiet': True,
+        'logtostderr': False,
+        'noprogress': False,  # We need progress for the progress_hook
+        'noplaylist': True,
+        'skip_download': False,
+        # Prefer mp4 format which has widest compatibility
+        'merge_output_format': 'mp4',
+    },
+}
+
+# Redirects (e.g. a channel URL pointing to its uploads tab) followed when enumerating a playlist
+MAX_PLAYLIST_REDIRECTS = 3
+
+# Process-wide pool, so extractions and downloads reuse initialized instances and connections
+ydl_pool = YoutubeDLPool(YDL_PROFILES)
+register_stats('ydl_pool', ydl_pool.stats, counters=('created', 'reused'))
+
+# Concurrent requests for the same video (and format) share one extraction or download.
+# A shared download's file is removed once every caller has linked its own copy.
+info_flight = SingleFlight()
+download_flight = SingleFlight(release=lambda result: shutil.rmtree(os.path.dirname(result[0]), ignore_errors=True))
+register_stats('info_flight', info_flight.stats, counters=('executed', 'shared'), gauges=('in_flight',))
+register_stats('download_flight', download_flight.stats, counters=('executed', 'shared'), gauges=('in_flight',))
 
 class YouTubeDownloader(BaseDownloader):
-    """YouTube video downloader implementation using yt-dlp"""
+    """YouTube video downloader implementation using yt-dlp
+    
+    YoutubeDL instances come from a shared pool that creates them on first
+    use, so loading this module (and the app's first render) doesn't pay for
+    yt-dlp's extractor registry.
+    """
     
     SUPPORTED_QUALITIES = ["1080p", "720p", "480p", "360p", "240p", "144p"]
     
+    VIDEO_ID_REGEX = re.compile(r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/|/v/)([0-9A-Za-z_-]{11})')
+    
+    # Also the registry's authority for which URLs this downloader takes (e.g. m. and music. hosts)
+    URL_REGEX = re.compile(r'(https?://)?([\w-]+\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/')
+    
+    def get_video_id(self, url: str) -> str:
+        """Normalize a YouTube URL to its video ID, falling back to the URL itself"""
+        match = self.VIDEO_ID_REGEX.search(url)
+        return match.group(1) if match else url.strip()
+    
+    def _extract_info(self, url: str, copy_info: bool = True) -> tuple:
+        """Extract video metadata, served from the shared metadata cache when possible
+        
+        Args:
+            url (str): YouTube video URL
+            copy_info (bool): Return a private copy of the info dict; without it the
+                cached dict is returned and must not be modified
+            
+        Returns:
+            tuple: The info dict, and the shared index of its formats
+        """
+        video_id = self.get_video_id(url)
+        
+        def extract():
+            with timed('extract', video_id=video_id), ydl_pool.borrow('info') as ydl:
+                info = ydl.extract_info(url, download=False)
+            # Index the formats once per extraction; every handle built from the cache shares it
+            return (info, FormatIndex.from_info(info)) if info else None
+        
+        # A link shared with a whole class is extracted once, not once per session
+        info, formats = info_flight.do(video_id, lambda: metadata_cache.get_or_set(video_id, extract))
+        # Callers outside the downloader may mutate the dict, so only they get a copy
+        return (copy.deepcopy(info) if copy_info else info), formats
+    
+    def _to_resolved(self, url: Union[str, ResolvedVideo], copy_info: bool = False) -> ResolvedVideo:
+        """Return a ResolvedVideo for a URL, passing existing handles through unchanged
+        
+        The downloader only reads the info dict (yt-dlp gets its own copy), so by
+        default the handle shares the cached one.
+        """
+        if isinstance(url, ResolvedVideo):
+            return url
+        info, formats = self._extract_info(url, copy_info=copy_info)
+        return ResolvedVideo(url=url, video_id=self.get_video_id(url), info=info, formats=formats)
+    
+    def _select_formats(self, resolved: ResolvedVideo, quality: str, **constraints) -> FormatChoice:
+        """Pick the formats for a quality (e.g. "720p") from the video's format index"""
+        choice = resolved.formats.select(int(quality.rstrip('p')), **constraints)
+        if choice is None:
+            raise ValueError(f"No format available for {quality}")
+        return choice
+    
+    def resolve(self, url: str) -> Optional[ResolvedVideo]:
+        """Extract video information once and return a reusable handle
+        
+        Args:
+            url (str): YouTube video URL
+            
+        Returns:
+            ResolvedVideo: Handle accepted by get_video_info, download_video and get_direct_stream_url
+        """
+        try:
+            # The handle is handed out, so it gets its own info dict
+            return self._to_resolved(url, copy_info=True)
+        except Exception as e:
+            print(f"Error resolving video: {str(e)}")
+            return None
+    
+    def warm_up(self) -> None:
+        """Build one pooled YoutubeDL per profile on a background thread"""
+        ydl_pool.warm()
+    
+    def peek(self, url: str, copy_info: bool = True) -> Optional[ResolvedVideo]:
+        """Return a handle for url from the metadata cache, or None on a miss
+        
+        With ``copy_info=False`` the handle shares the cached info dict, which
+        must not be modified.
+        """
+        video_id = self.get_video_id(url)
+        # A miss is counted by the extraction that follows it
+        cached = metadata_cache.get(video_id, count_miss=False)
+        if cached is None:
+            return None
+        info, formats = cached
+        return ResolvedVideo(url=url, video_id=video_id, info=copy.deepcopy(info) if copy_info else info, formats=formats)
+    
     def supports_url(self, url: str) -> bool:
         """Check if URL is a valid YouTube URL"""
-        youtube_regex = r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/'
-        return bool(re.match(youtube_regex, url))
+        return bool(self.URL_REGEX.match(url))
     
-    def get_video_info(self, url: str) -> Optional[VideoInfo]:
+    def get_video_info(self, url: Union[str, ResolvedVideo]) -> Optional[VideoInfo]:
         """Get video information without downloading"""
         try:
-            ydl_opts = {'quiet': True}
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                # Create more flexible filtering to find more format options
-                qualities = []
-                
-                # First find formats with both audio and video in one stream (easier to play)
-                combined_formats = [
-                    f for f in info['formats'] 
-                    if f.get('ext') == 'mp4' and f.get('acodec') != 'none' and f.get('vcodec') != 'none'
-                ]
-                
-                # Get qualities from combined formats
-                for f in combined_formats:
-                    if f.get('height') and f"{f['height']}p" in self.SUPPORTED_QUALITIES:
-                        qualities.append(f"{f['height']}p")
-                        
-                # If combined formats don't provide enough options, 
-                # look at all available video formats
-                if len(qualities) <= 1:
-                    video_formats = [
-                        f for f in info['formats'] 
-                        if f.get('vcodec') != 'none' and f.get('height')
-                    ]
-                    
-                    for f in video_formats:
-                        if f"{f['height']}p" in self.SUPPORTED_QUALITIES:
-                            qualities.append(f"{f['height']}p")
-                
-                # Remove duplicates and sort
-                qualities = sorted(list(set(qualities)), key=lambda x: int(x.rstrip('p')), reverse=True)
-                
-                # Get thumbnail URL
-                thumbnail_url = info.get('thumbnail', '')
-                
-                # If no qualities found, use default supported qualities
-                if not qualities:
-                    qualities = self.SUPPORTED_QUALITIES
-                
-                video_info = VideoInfo(
-                    title=info['title'],
-                    duration=info['duration'],
-                    url=url,
-                    available_qualities=qualities
-                )
-                
-                # Add thumbnail URL as a custom attribute
-                video_info.thumbnail_url = thumbnail_url
-                
-                return video_info
+            # Read-only, so a cached video is served without copying its info dict
+            resolved = (isinstance(url, str) and self.peek(url, copy_info=False)) or self._to_resolved(url)
+            info = resolved.info
+            
+            # Qualities come from the format index built when the video was extracted
+            qualities = resolved.formats.available_qualities(self.SUPPORTED_QUALITIES)
+            
+            # Get thumbnail URL
+            thumbnail_url = info.get('thumbnail', '')
+            
+            # If no qualities found, use default supported qualities
+            if not qualities:
+                qualities = self.SUPPORTED_QUALITIES
+            
+            video_info = VideoInfo(
+                title=info['title'],
+                duration=info['duration'],
+                url=resolved.url,
+                available_qualities=qualities
+            )
+            
+            # Add thumbnail URL as a custom attribute
+            video_info.thumbnail_url = thumbnail_url
+            
+            return video_info
         except Exception as e:
             print(f"Error getting video info: {str(e)}")
             return None
     
-    def download_video(self, url: str, quality: str, progress_hook=None) -> DownloadResult:
+    def download_video(self, url: Union[str, ResolvedVideo], quality: str, progress_hook=None, as_file: bool = False, connections: int = 1, bandwidth_group: Optional[str] = None) -> DownloadResult:
         """Download a single video
         
         Args:
-            url (str): YouTube video URL
+            url (str | ResolvedVideo): YouTube video URL or a handle returned by resolve()
             quality (str): Video quality (e.g. "720p")
             progress_hook (callable, optional): Progress hook function for tracking download progress
+            as_file (bool): Leave the output on disk (``file_path``) instead of reading it into ``data``
+            connections (int): Concurrent connections per format (byte ranges for plain
+                HTTP formats, fragments for DASH/HLS); 1 keeps yt-dlp's single connection
+            bandwidth_group (str, optional): Share of the global bandwidth cap this download
+                draws from, e.g. its job's ID; by default it gets a share of its own
             
         Returns:
             DownloadResult: Download result with video data and info
         """
         try:
-            height = int(quality.rstrip('p'))
+            # Resolve first (reuses an existing handle, so the download below does not extract again)
+            resolved = self._to_resolved(url)
+            info = resolved.info
             
-            # Create format selection based on quality with explicit MP4 preference
-            if height >= 720:
-                format_str = f'bestvideo[height<={height}][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<={height}]+bestaudio/best[height<={height}][ext=mp4]/best[height<={height}]'
-            else:
-                format_str = f'best[height<={height}][ext=mp4]/best[height<={height}]'
+            # Look the formats up in the index (no network round-trip, no format string
+            # for yt-dlp to evaluate) and only transcode the streams that can't be
+            # copied into mp4 as they are
+            with timed('format_select', video_id=resolved.video_id) as log:
+                choice = self._select_formats(resolved, quality)
+                log['format_id'] = choice.format_id
             
-            # Select format that's more likely to be compatible with most players
+            # FFmpeg is only resolved (and probed, on a cold cache) when a merge needs it;
+            # the plan only uses encoders the binary has
+            merge = choice.merged
+            ffmpeg = get_ffmpeg_info() if merge else None
+            plan = plan_postprocessing(list(choice.formats), container='mp4', ffmpeg=ffmpeg)
+            
+            # Per-call options on top of the pooled 'download' profile
             ydl_opts = {
-                'format': format_str,
-                'quiet': True,
-                'logtostderr': False,
-                'noprogress': False,  # We need progress for the progress_hook
-                'noplaylist': True,
-                'skip_download': False,
-                # Prefer mp4 format which has widest compatibility
-                'merge_output_format': 'mp4',
-                # Force mp4 output with compatible codecs
-                'postprocessor_args': {
-                    'ffmpeg': ['-c:v', 'libx264', '-c:a', 'aac']
-                },
+                'format': choice.format_id,
+                # Multi-connection fetching (see SegmentedYoutubeDL)
+                'segmented_connections': connections,
+                'concurrent_fragment_downloads': connections,
             }
+            if plan.ffmpeg_args:
+                ydl_opts['postprocessor_args'] = {'merger': plan.ffmpeg_args}
+            if ffmpeg:
+                ydl_opts['ffmpeg_location'] = ffmpeg.path
             
-            # Add progress hooks if provided
-            if progress_hook:
-                ydl_opts['progress_hooks'] = [progress_hook]
+            def fetch(cache_key, hook):
+                return self._fetch(cache_key, resolved, choice, "video.mp4", ydl_opts, hook, bandwidth_group,
+                                   merge_plan=plan if merge else None)
             
-            # Get info first
-            with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
-                info = ydl.extract_info(url, download=False)
+            return self._download(resolved, choice, plan, quality, fetch, progress_hook=progress_hook, as_file=as_file)
+        except Exception as e:
+            print(f"Download error: {str(e)}")
+            record_error('download', e, url=getattr(url, 'url', url))
+            return DownloadResult(success=False, error=str(e))
+    
+    def download_audio(self, url: Union[str, ResolvedVideo], quality: str = "best", progress_hook=None, as_file: bool = False, connections: int = 1, bandwidth_group: Optional[str] = None) -> DownloadResult:
+        """Download only the audio track of a video
+        
+        Fetches the best audio-only format within the quality and never touches
+        the video streams. The audio is stream-copied, never re-encoded: into
+        m4a for AAC and opus for Opus when ffmpeg is available, otherwise it is
+        kept in the container it was downloaded in.
+        
+        Args:
+            url (str | ResolvedVideo): YouTube video URL or a handle returned by resolve()
+            quality (str): Maximum audio bitrate (e.g. "128k"), or "best"
+            progress_hook (callable, optional): Progress hook function for tracking download progress
+            as_file (bool): Leave the output on disk (``file_path``) instead of reading it into ``data``
+            connections (int): Concurrent connections (see download_video)
+            bandwidth_group (str, optional): Share of the global bandwidth cap (see download_video)
             
-            # Direct download to file
-            import tempfile
-            import os
+        Returns:
+            DownloadResult: Download result with audio data and info; ``video_info['ext']``
+                is the extension of the output
+        """
+        try:
+            resolved = self._to_resolved(url)
             
-            # Create a temp directory to store the download
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_filename = os.path.join(temp_dir, "video.mp4")
-                
-                # Set output template
-                ydl_opts['outtmpl'] = temp_filename
-                
-                # Download the video
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([url])
-                
-                # Check if file exists
-                if not os.path.exists(temp_filename):
-                    # Try to find any file created in the temp directory
-                    files = os.listdir(temp_dir)
-                    if files:
-                        temp_filename = os.path.join(temp_dir, files[0])
-                    else:
-                        return DownloadResult(success=False, error="Failed to download video. No output file created.")
-                
-                # Read file into buffer
-                with open(temp_filename, 'rb') as f:
-                    video_data = f.read()
+            with timed('format_select', video_id=resolved.video_id) as log:
+                max_bitrate = None if quality == "best" else float(quality.rstrip('k'))
+                choice = resolved.formats.select_audio(max_bitrate=max_bitrate)
+                if choice is None:
+                    raise ValueError("No audio-only format available")
+                log['format_id'] = choice.format_id
             
-            # Extract title and duration properly
-            title = info.get('title', 'Video')
-            duration = info.get('duration', 0)
-            if isinstance(duration, str):
-                try:
-                    duration = int(duration)
-                except ValueError:
-                    duration = 0
-                    
-            # Get thumbnail URL
-            thumbnail_url = info.get('thumbnail', '')
+            plan = plan_audio_extraction(choice.main)
+            remux_path = None
+            if plan.ffmpeg_args:
+                ffmpeg = get_ffmpeg_info()
+                if ffmpeg:
+                    remux_path = ffmpeg.path
+                else:
+                    # Still a stream copy, just in the container it comes in
+                    plan = plan_audio_extraction(choice.main, remux=False)
             
-            # Get file size
-            file_size = len(video_data)
-            
-            return DownloadResult(
-                success=True,
-                data=video_data,
-                video_info={
-                    'title': title,
-                    'duration': duration,
-                    'quality': quality,
-                    'thumbnail_url': thumbnail_url,
-                    'file_size': file_size
-                }
+            ydl_opts = {
+                'format': choice.format_id,
+                'segmented_connections': connections,
+                'concurrent_fragment_downloads': connections,
+            }
+            
+            def fetch(cache_key, hook):
+                return self._fetch(cache_key, resolved, choice, f"audio.{plan.container}", ydl_opts, hook, bandwidth_group,
+                                   remux_plan=plan if remux_path else None, remux_path=remux_path)
+            
+            return self._download(resolved, choice, plan, quality, fetch, progress_hook=progress_hook, as_file=as_file)
+        except Exception as e:
+            print(f"Download error: {str(e)}")
+            record_error('download', e, url=getattr(url, 'url', url))
+            return DownloadResult(success=False, error=str(e))
+    
+    def download_clip(self, url: Union[str, ResolvedVideo], quality: str, start: float, end: float, progress_hook=None, as_file: bool = False, bandwidth_group: Optional[str] = None) -> DownloadResult:
+        """Download the [start, end) seconds of a video without downloading the rest
+        
+        Uses the direct format URLs (as get_direct_stream_url does) and lets ffmpeg
+        seek in them, so only the byte ranges covering the clip are fetched. Streams
+        are copied, so the clip starts at the keyframe at or before ``start``.
+        
+        Args:
+            url (str | ResolvedVideo): YouTube video URL or a handle returned by resolve()
+            quality (str): Video quality (e.g. "720p")
+            start (float): Clip start in seconds
+            end (float): Clip end in seconds, capped at the video's duration
+            progress_hook (callable, optional): Progress hook function for tracking download progress
+            as_file (bool): Leave the output on disk (``file_path``) instead of reading it into ``data``
+            bandwidth_group (str, optional): Share of the global bandwidth cap (see download_video)
+            
+        Returns:
+            DownloadResult: Download result with the clip's data and info; ``video_info['clip']``
+                holds the requested range
+        """
+        try:
+            resolved = self._to_resolved(url)
+            
+            duration = resolved.info.get('duration') or 0
+            if duration:
+                end = min(end, duration)
+            if start < 0 or end <= start:
+                raise ValueError(f"Invalid clip range: {start}-{end} seconds")
+            
+            # Only formats with a single direct URL can be seeked in; DASH manifests can't
+            with timed('format_select', video_id=resolved.video_id) as log:
+                choice = self._select_formats(resolved, quality, direct=True)
+                log['format_id'] = choice.format_id
+            
+            ffmpeg = get_ffmpeg_info()
+            if not ffmpeg:
+                raise RuntimeError("FFmpeg is required to cut clips")
+            
+            plan = plan_clip(start, end)
+            
+            def fetch(cache_key, hook):
+                return self._fetch_clip(cache_key, resolved, choice, start, end, plan, ffmpeg.path, hook, bandwidth_group)
+            
+            return self._download(
+                resolved, choice, plan, quality, fetch, progress_hook=progress_hook, as_file=as_file,
+                # The seek is an input option, so it isn't part of the plan's arguments
+                profile=f"{plan.profile}/{start:.3f}",
+                extra_info={'duration': int(round(end - start)), 'clip': {'start': start, 'end': end}}
             )
         except Exception as e:
             print(f"Download error: {str(e)}")
+            record_error('download', e, url=getattr(url, 'url', url))
             return DownloadResult(success=False, error=str(e))
     
-    def get_playlist_videos(self, url: str) -> List[str]:
-        """Get list of video URLs from a playlist"""
+    def _download(self, resolved: ResolvedVideo, choice: FormatChoice, plan, quality: str, fetch,
+                  progress_hook=None, as_file: bool = False, profile: Optional[str] = None, extra_info: Optional[dict] = None) -> DownloadResult:
+        """Produce the output (shared with identical concurrent requests) and build the result
+        
+        Args:
+            fetch (callable): Called as ``fetch(cache_key, hook)`` by one of the identical
+                requests; returns the output's path in a directory of its own and
+                whether it came from the cache (see ``_fetch``)
+            profile (str, optional): Cache profile of the output, the plan's by default
+            extra_info (dict, optional): Entries added to (or replacing those of) ``video_info``
+        """
+        info = resolved.info
+        
+        # Identical video, formats and postprocessing produce an identical file, so
+        # concurrent identical requests share one download (and one merge)
+        cache_key = download_cache.make_key(resolved.video_id, choice.format_id, profile or plan.profile)
+        
+        temp_dir = None
+        keep_dir = False
         try:
-            ydl_opts = {
-                'quiet': True,
-                'extract_flat': True,
-                'skip_download': True,
-            }
+            with download_flight.join(cache_key, lambda hook: fetch(cache_key, hook), progress_hook) as (shared_filename, cache_hit):
+                # Every caller gets a link of its own. File-backed results take
+                # ownership of it, otherwise it is removed once the data is read.
+                temp_filename = download_cache.copy_to_work_dir(shared_filename)
+                temp_dir = os.path.dirname(temp_filename)
+            
+            file_size = os.path.getsize(temp_filename)
+            
+            if as_file:
+                video_data = None
+                keep_dir = True
+            else:
+                # Read file into buffer
+                with timed('read', size=file_size), open(temp_filename, 'rb') as f:
+                    video_data = f.read()
+        finally:
+            if temp_dir and not keep_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+        
+        # Extract title and duration properly
+        title = info.get('title', 'Video')
+        duration = info.get('duration', 0)
+        if isinstance(duration, str):
+            try:
+                duration = int(duration)
+            except ValueError:
+                duration = 0
+                
+        # Get thumbnail URL
+        thumbnail_url = info.get('thumbnail', '')
+        
+        video_info = {
+            'title': title,
+            'duration': duration,
+            'quality': quality,
+            'thumbnail_url': thumbnail_url,
+            'file_size': file_size,
+            'ext': os.path.splitext(temp_filename)[1].lstrip('.'),
+            'postprocessing': plan.to_dict(),
+            'cache': 'hit' if cache_hit else 'miss'
+        }
+        video_info.update(extra_info or {})
+        
+        return DownloadResult(
+            success=True,
+            data=video_data,
+            file_path=temp_filename if as_file else None,
+            work_dir=temp_dir if as_file else None,
+            video_info=video_info
+        )
+    
+    def _fetch(self, cache_key: str, resolved: ResolvedVideo, choice: FormatChoice, output_name: str, ydl_opts: dict, progress_hook, bandwidth_group: Optional[str],
+               merge_plan=None, remux_plan=None, remux_path: Optional[str] = None) -> tuple:
+        """Produce the file for a download from the on-disk cache or upstream
+        
+        Runs once per group of identical concurrent requests (see ``download_flight``).
+        With a remux plan, the download is rewritten into output_name's container
+        by the ffmpeg at remux_path afterwards.
+        
+        Returns:
+            tuple: Path of the file in a directory of its own, and whether it came from the cache
+        """
+        info = resolved.info
+        
+        # Partial files (.part, fragment and segment state) live in a stable directory
+        # keyed by the download, so a retry after a crash or error resumes instead of
+        # starting over. They are only removed once the download succeeds.
+        work_dir = download_cache.acquire_work_dir(cache_key)
+        keep_partial = True
+        try:
+            work_filename = os.path.join(work_dir, output_name)
+            
+            # Serve repeat requests from the on-disk cache
+            with timed('cache_lookup', video_id=resolved.video_id) as log:
+                cache_hit = download_cache.materialize(cache_key, work_filename)
+                log['hit'] = cache_hit
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                playlist_info = ydl.extract_info(url, download=False)
+            if not cache_hit:
+                # Set output template; a remux reads the download in its own container
+                download_filename = work_filename
+                if remux_plan is not None:
+                    download_filename = os.path.join(work_dir, f"download.{choice.ext}")
+                ydl_opts = dict(ydl_opts, outtmpl=download_filename)
                 
-                if 'entries' in playlist_info:
-                    video_urls = []
-                    for entry in playlist_info['entries']:
-                        if entry.get('url'):
-                            video_urls.append(f"https://www.youtube.com/watch?v={entry['id']}")
-                    return video_urls
+                # Download the video from the already-extracted info, timing the
+                # first byte and the end of the transfer through the progress hook
+                timing = {'started': time.perf_counter(), 'first_byte': None, 'transferred': None}
                 
-            return []
+                with bandwidth_manager.allocate(bandwidth_group) as allocation:
+                    def timing_hook(d):
+                        if timing['first_byte'] is None and d.get('downloaded_bytes'):
+                            timing['first_byte'] = time.perf_counter()
+                        if d.get('status') == 'finished':
+                            timing['transferred'] = time.perf_counter()
+                        allocation.progress_hook(d)
+                        progress_hook(d)
+                    
+                    with ydl_pool.borrow('download', progress_hook=timing_hook, **ydl_opts) as ydl, \
+                            allocation.bound(ydl.params):
+                        ydl.process_ie_result(copy.deepcopy(info), download=True)
+                timing['done'] = time.perf_counter()
+                
+                if remux_plan is not None and os.path.exists(download_filename):
+                    with timed('postprocess', video_id=resolved.video_id, mode=remux_plan.mode, container=remux_plan.container):
+                        remux(remux_path, download_filename, work_filename, remux_plan.ffmpeg_args)
+                    os.remove(download_filename)
+                
+                # Check if file exists
+                if not os.path.exists(work_filename):
+                    # Try to find any finished file created in the work directory
+                    files = [
+                        name for name in os.listdir(work_dir)
+                        if not name.endswith(('.part', '.ytdl', '.segments', '.temp'))
+                    ]
+                    if not files:
+                        raise IOError("Failed to download video. No output file created.")
+                    work_filename = os.path.join(work_dir, files[0])
+                
+                self._record_download_timing(timing, os.path.getsize(work_filename), merge_plan, resolved.video_id)
+                
+                download_cache.put(cache_key, work_filename, meta={
+                    'video_id': resolved.video_id,
+                    'format_id': choice.format_id,
+                    'title': info.get('title', 'Video')
+                })
+            
+            shared_filename = self._share(work_filename)
+            keep_partial = False
+            return shared_filename, cache_hit
+        finally:
+            download_cache.release_work_dir(cache_key, work_dir, keep_partial=keep_partial)
+    
+    def _fetch_clip(self, cache_key: str, resolved: ResolvedVideo, choice: FormatChoice, start: float, end: float, plan, ffmpeg_path: str, progress_hook, bandwidth_group: Optional[str]) -> tuple:
+        """Produce the file for a clip from the on-disk cache or by cutting it upstream
+        
+        Like ``_fetch``, runs once per group of identical concurrent requests.
+        
+        Returns:
+            tuple: Path of the file in a directory of its own, and whether it came from the cache
+        """
+        work_dir = download_cache.acquire_work_dir(cache_key)
+        try:
+            work_filename = os.path.join(work_dir, f"clip.{plan.container}")
+            
+            with timed('cache_lookup', video_id=resolved.video_id) as log:
+                cache_hit = download_cache.materialize(cache_key, work_filename)
+                log['hit'] = cache_hit
+            
+            if not cache_hit:
+                clip_seconds = end - start
+                # Until ffmpeg reports output, estimate the clip's share of the formats' size
+                estimate = choice.filesize * clip_seconds / resolved.info['duration'] if resolved.info.get('duration') else None
+                started = time.perf_counter()
+                
+                # ffmpeg fetches on its own, so the clip is accounted to its bandwidth
+                # group (and paced coarsely) from the progress it reports
+                with bandwidth_manager.allocate(bandwidth_group) as allocation:
+                    def on_progress(seconds, size):
+                        total = size * clip_seconds / seconds if seconds > 0 else estimate
+                        d = {
+                            'status': 'downloading',
+                            'filename': work_filename,
+                            'downloaded_bytes': size,
+                            'total_bytes_estimate': max(total, size) if total else None,
+                            'elapsed': time.perf_counter() - started,
+                        }
+                        allocation.progress_hook(d)
+                        progress_hook(d)
+                    
+                    inputs = [(f['url'], f.get('http_headers') or {}) for f in choice.formats]
+                    with timed('clip', video_id=resolved.video_id, start=start, end=end, format_id=choice.format_id):
+                        cut_clip(ffmpeg_path, inputs, start, plan, work_filename, progress=on_progress)
+                
+                size = os.path.getsize(work_filename)
+                progress_hook({'status': 'finished', 'filename': work_filename, 'downloaded_bytes': size, 'total_bytes': size})
+                
+                download_cache.put(cache_key, work_filename, meta={
+                    'video_id': resolved.video_id,
+                    'format_id': choice.format_id,
+                    'title': resolved.info.get('title', 'Video'),
+                    'clip': [start, end]
+                })
+            
+            return self._share(work_filename), cache_hit
+        finally:
+            # An interrupted cut can't be resumed, so nothing is kept
+            download_cache.release_work_dir(cache_key, work_dir, keep_partial=False)
+    
+    def _share(self, work_filename: str) -> str:
+        """Move a finished file out of its stable work directory into one of its own
+        
+        The callers sharing the download link it from there.
+        """
+        shared_dir = download_cache.make_work_dir()
+        shared_filename = os.path.join(shared_dir, os.path.basename(work_filename))
+        os.replace(work_filename, shared_filename)
+        return shared_filename
+    
+    def _record_download_timing(self, timing: dict, size: int, merge_plan, video_id: str) -> None:
+        """Record time to first byte, transfer time and throughput, and the merge/transcode time"""
+        started, done = timing['started'], timing['done']
+        # Without a finished event (e.g. nothing to download) the whole call counts as transfer
+        transferred = timing['transferred'] or done
+        transfer_seconds = max(transferred - started, 1e-6)
+        
+        if timing['first_byte'] is not None:
+            metrics.observe('time_to_first_byte_seconds', timing['first_byte'] - started,
+                            help_text='Time from starting a download to its first byte')
+        metrics.observe('download_throughput_bytes_per_second', size / transfer_seconds, buckets=THROUGHPUT_BUCKETS,
+                        help_text='Throughput of downloads')
+        metrics.inc('downloaded_bytes_total', size, help_text='Bytes downloaded from upstream')
+        record_stage('download', transfer_seconds, video_id=video_id, bytes=size,
+                     ttfb=round(timing['first_byte'] - started, 4) if timing['first_byte'] is not None else None)
+        
+        # yt-dlp merges (and transcodes, if planned) after the last format finished
+        if merge_plan is not None:
+            record_stage('postprocess', done - transferred, video_id=video_id, mode=merge_plan.mode)
+    
+    def get_playlist_videos(self, url: str) -> List[PlaylistEntry]:
+        """Get the entries of a playlist from flat-playlist metadata
+        
+        Titles, durations and thumbnails come from the flat extraction, so no
+        per-video extraction is needed to display the playlist.
+        """
+        try:
+            return list(self.iter_playlist_videos(url))
         except Exception as e:
             print(f"Playlist error: {str(e)}")
             return []
+    
+    def iter_playlist_videos(self, url: str, start: int = 0, limit: Optional[int] = None) -> Iterator[PlaylistEntry]:
+        """Yield the entries of a playlist as yt-dlp fetches its pages
+        
+        The playlist is extracted without processing, so yt-dlp's lazy entry
+        list is consumed one entry at a time instead of being walked to the
+        end first: the first entries of a long channel upload list are
+        available after its first page. Paged playlists only fetch the pages
+        covering the window.
+        
+        Args:
+            url (str): Playlist URL
+            start (int): Index of the first entry to yield
+            limit (int, optional): Maximum number of entries to yield
+            
+        Raises:
+            Exception: Extraction errors, which may also occur after some entries were yielded
+        """
+        end = None if limit is None else start + limit
+        with timed('playlist_extract', url=url) as log, ydl_pool.borrow('playlist') as ydl:
+            playlist_info = ydl.extract_info(url, download=False, process=False)
+            # Unprocessed results may point to the actual playlist page
+            for _ in range(MAX_PLAYLIST_REDIRECTS):
+                if not playlist_info or playlist_info.get('_type') not in ('url', 'url_transparent'):
+                    break
+                playlist_info = ydl.extract_info(playlist_info['url'], download=False, process=False,
+                                                 ie_key=playlist_info.get('ie_key'))
+            
+            entries = (playlist_info or {}).get('entries') or []
+            if hasattr(entries, 'getslice'):
+                # Paged lists fetch only the pages a slice needs
+                window = entries.getslice(start, end)
+            else:
+                window = itertools.islice(entries, start, end)
+            
+            count = 0
+            for entry in window:
+                if entry and entry.get('url') and entry.get('id'):
+                    count += 1
+                    log['entries'] = count
+                    yield self._to_playlist_entry(entry)
 
-    def get_direct_stream_url(self, url: str, quality: str) -> dict:
+    def _to_playlist_entry(self, entry: dict) -> PlaylistEntry:
+        """Build a PlaylistEntry from a flat-playlist entry dict"""
+        video_url = f"https://www.youtube.com/watch?v={entry['id']}"
+        
+        # Flat entries carry a list of thumbnails, the last one being the largest
+        thumbnails = entry.get('thumbnails') or []
+        thumbnail_url = thumbnails[-1].get('url', '') if thumbnails else entry.get('thumbnail', '')
+        
+        return PlaylistEntry(
+            id=entry['id'],
+            url=video_url,
+            title=entry.get('title') or video_url,
+            duration=int(entry.get('duration') or 0),
+            thumbnail_url=thumbnail_url or ''
+        )
+    
+    def get_direct_stream_url(self, url: Union[str, ResolvedVideo], quality: str) -> dict:
         """Get direct stream URL for a YouTube video without downloading it
         
         Args:
-            url (str): YouTube video URL
+            url (str | ResolvedVideo): YouTube video URL or a handle returned by resolve()
             quality (str): Video quality (e.g. "720p")
             
         Returns:
             dict: Dictionary with direct URL and video information
         """
         try:
-            height = int(quality.rstrip('p'))
+            resolved = self._to_resolved(url)
+            info = resolved.info
             
-            # Create format selection based on quality with explicit MP4 preference
-            # The format string prioritizes mp4 and explicitly excludes webm
-            if height >= 720:
-                format_str = f'bestvideo[height<={height}][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<={height}]+bestaudio/best[height<={height}][ext=mp4]/best[height<={height}]'
-            else:
-                format_str = f'best[height<={height}][ext=mp4]/best[height<={height}]'
+            # Only formats with a single direct URL qualify, so no DASH manifests
+            choice = resolved.formats.select(int(quality.rstrip('p')), direct=True)
+            if choice is None:
+                return {
+                    'success': False,
+                    'error': 'Could not find direct URL in the video info'
+                }
             
-            # Configure yt-dlp to get direct URLs with mp4 preference
-            ydl_opts = {
-                'format': format_str,
-                'quiet': True,
-                'no_warnings': True,
-                'skip_download': True,  # Don't download, just get info
-                'youtube_include_dash_manifest': False,
-                'merge_output_format': 'mp4',  # Force MP4 output
-                'postprocessor_args': {
-                    'ffmpeg': ['-c:v', 'libx264', '-c:a', 'aac']  # Use standard mp4 codecs
-                },
-            }
+            # The first format carries the video (the only one unless merged)
+            direct_url = choice.main['url']
             
-            # Get video info and URL
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                # Get the best format matching our criteria
-                if 'url' in info:
-                    # Single format case
-                    direct_url = info['url']
-                    
-                    # Check if it's a webm format and warn
-                    is_webm = False
-                    if 'ext' in info and info['ext'] == 'webm':
-                        is_webm = True
-                        print("Warning: Selected format is webm despite requesting mp4")
-                        
-                    file_size = info.get('filesize') or info.get('filesize_approx', 0)
-                elif 'requested_formats' in info:
-                    # Multiple formats case (video+audio)
-                    # Check format of first stream (usually video)
-                    formats = info['requested_formats']
-                    main_format = formats[0]
-                    
-                    # Check if it's a webm format and warn
-                    is_webm = False
-                    if 'ext' in main_format and main_format['ext'] == 'webm':
-                        is_webm = True
-                        print(f"Warning: Selected format is {main_format['ext']} despite requesting mp4")
-                    
-                    direct_url = main_format['url']
-                    file_size = sum(f.get('filesize', 0) or f.get('filesize_approx', 0) 
-                                    for f in formats)
-                else:
-                    return {
-                        'success': False,
-                        'error': 'Could not find direct URL in the video info'
-                    }
-                
-                # Get filename safe title
-                import re
-                safe_title = re.sub(r'[^\w\-_\. ]', '_', info['title'])
-                
-                # Include format information in the response
-                formats_info = []
-                if 'formats' in info:
-                    # Get available mp4 formats for debugging
-                    mp4_formats = [f for f in info['formats'] if f.get('ext') == 'mp4']
-                    for f in mp4_formats[:3]:  # Just include a few for reference
-                        formats_info.append({
-                            'format_id': f.get('format_id', ''),
-                            'ext': f.get('ext', ''),
-                            'resolution': f"{f.get('width', '')}x{f.get('height', '')}"
-                        })
-                
-                return {
-                    'success': True,
-                    'direct_url': direct_url,
-                    'title': info['title'],
-                    'safe_title': safe_title,
-                    'duration': info.get('duration', 0),
-                    'file_size': file_size,
-                    'file_size_mb': file_size / (1024 * 1024) if file_size else 0,
-                    'thumbnail_url': info.get('thumbnail', ''),
-                    'quality': quality,
-                    'is_webm': is_webm,
-                    'available_mp4_formats': formats_info
+            # Check if it's a webm format and warn
+            is_webm = choice.ext == 'webm'
+            if is_webm:
+                print(f"Warning: Selected format is {choice.ext} despite requesting mp4")
+            
+            file_size = choice.filesize
+            
+            # Get filename safe title
+            safe_title = re.sub(r'[^\w\-_\. ]', '_', info['title'])
+            
+            # Include format information in the response: a few of the best mp4 formats for reference
+            formats_info = [
+                {
+                    'format_id': f.get('format_id', ''),
+                    'ext': f.get('ext', ''),
+                    'resolution': f"{f.get('width', '')}x{f.get('height', '')}"
                 }
-                
+                for f in resolved.formats.by_ext.get('mp4', [])[:3]
+            ]
+            
+            return {
+                'success': True,
+                'direct_url': direct_url,
+                'title': info['title'],
+                'safe_title': safe_title,
+                'duration': info.get('duration', 0),
+                'file_size': file_size,
+                'file_size_mb': file_size / (1024 * 1024) if file_size else 0,
+                'thumbnail_url': info.get('thumbnail', ''),
+                'quality': quality,
+                'is_webm': is_webm,
+                'available_mp4_formats': formats_info
+            }
+            
         except Exception as e:
             print(f"Error getting direct URL: {str(e)}")
             return {
@@ -1,15 +1,65 @@
-from typing import Dict, Type
-from src.Core.base import BaseDownloader
-from src.Core.youtube import YouTubeDownloader
+import os
+from typing import Any, Dict
+from src.Core.registry import DownloaderRegistry
 
-# Mapping of supported downloaders
-DOWNLOADERS: Dict[str, Type[BaseDownloader]] = {
-    "youtube": YouTubeDownloader
+# Supported downloaders: import path ("module:Class") and hosts for O(1) URL
+# dispatch; the downloader's supports_url decides which URLs it takes.
+# Backends (and yt-dlp with them) are only imported on first use, so the UI
+# can render before any extractor code is loaded.
+DOWNLOADERS: Dict[str, Dict[str, Any]] = {
+    "youtube": {
+        "path": "src.Core.youtube:YouTubeDownloader",
+        "hosts": [
+            "youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com",
+            "youtu.be", "www.youtu.be",
+            "youtube-nocookie.com", "www.youtube-nocookie.com",
+        ],
+    }
 }
 
+# Shared downloader instances, created on first use
+downloader_registry = DownloaderRegistry(DOWNLOADERS)
+
+
+# Import the downloader backends and pre-build their YoutubeDL instances in the
+# background once the app has rendered, so the first request doesn't pay for it
+PREWARM_DOWNLOADERS = os.getenv("PREWARM_DOWNLOADERS", "1") == "1"
+
+
 # Default supported qualities (from lowest to highest)
 DEFAULT_QUALITIES = ["144p", "240p", "360p", "480p", "720p", "1080p"]
 
+# Audio-only qualities, as maximum audio bitrates (from lowest to highest);
+# "best" takes the best audio stream regardless of bitrate
+AUDIO_QUALITIES = ["48k", "64k", "128k", "160k", "best"]
+
+# Upper bound on how many playlist videos are downloaded in parallel
+MAX_CONCURRENT_DOWNLOADS = 4
+
+# Concurrent connections used to fetch each format of a server-side download
+SEGMENTED_CONNECTIONS = 4
+
+# Total download rate of the server in bytes per second, shared fairly between
+# running jobs; 0 means unlimited
+BANDWIDTH_LIMIT = int(os.getenv("BANDWIDTH_LIMIT", "0"))
+
+# Port of the Prometheus metrics exporter started by the app; 0 (the default) disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Interface the metrics exporter listens on; the endpoint is unauthenticated
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Public URL browsers reach the streaming file server at (e.g. a proxied path or a
+# forwarded port). The server that hands finished server-side downloads to the
+# browser is opt-in: it only starts when this is set, otherwise downloads go
+# through Streamlit download buttons.
+FILE_SERVER_URL = os.getenv("FILE_SERVER_URL", "")
+
+# Port and interface the file server listens on; put a proxy in front of it, or
+# set 0.0.0.0 to expose it directly
+FILE_SERVER_PORT = int(os.getenv("FILE_SERVER_PORT", "8502"))
+FILE_SERVER_HOST = os.getenv("FILE_SERVER_HOST", "127.0.0.1")
+
 # UI Configuration
 UI_CONFIG = {
     "page_title": "Video Downloader",
@@ -0,0 +1,96 @@
+"""
+Clip extraction
+
+Cuts a time range out of a video's direct format URLs with ffmpeg, without
+downloading the video. ``-ss`` is given as an input option, so ffmpeg seeks
+in the remote file with HTTP range requests (guided by the container's
+index) and only fetches the bytes that cover the clip. Streams are copied,
+not re-encoded, so the clip starts at the last keyframe at or before the
+requested start, and both bandwidth and CPU time scale with the clip
+length rather than the video length.
+"""
+
+import subprocess
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .postprocess import COPY, PostprocessPlan
+
+# Direct URL of a format and the HTTP headers it has to be requested with
+ClipInput = Tuple[str, Dict[str, str]]
+
+
+def plan_clip(start: float, end: float, container: str = 'mp4') -> PostprocessPlan:
+    """Build the plan for a stream-copied clip of [start, end) seconds
+
+    ``ffmpeg_args`` are the output options; the seek itself is an input
+    option added by ``cut_clip``.
+    """
+    args = ['-t', f"{end - start:.3f}", '-c', COPY, '-avoid_negative_ts', 'make_zero']
+    if container == 'mp4':
+        # Index in front, so the clip plays while it is still downloading
+        args += ['-movflags', '+faststart']
+    return PostprocessPlan(container=container, video=COPY, audio=COPY, ffmpeg_args=args)
+
+
+def _headers_arg(headers: Dict[str, str]) -> List[str]:
+    if not headers:
+        return []
+    return ['-headers', ''.join(f"{name}: {value}\r\n" for name, value in headers.items())]
+
+
+def cut_clip(
+    ffmpeg_path: str,
+    inputs: Sequence[ClipInput],
+    start: float,
+    plan: PostprocessPlan,
+    dest_path: str,
+    progress: Optional[Callable[[float, int], None]] = None,
+) -> None:
+    """Write the clip of the given inputs (e.g. video and audio) to dest_path
+
+    Args:
+        ffmpeg_path (str): FFmpeg binary
+        inputs (list): Direct URLs and headers of the formats to cut and merge
+        start (float): Clip start in seconds
+        plan (PostprocessPlan): Plan from ``plan_clip``
+        dest_path (str): Output file
+        progress (callable, optional): Called as ``progress(seconds_written, bytes_written)``
+            about twice a second; if it raises, ffmpeg is stopped and the error re-raised
+
+    Raises:
+        RuntimeError: ffmpeg failed
+    """
+    cmd = [ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y']
+    for url, headers in inputs:
+        cmd += _headers_arg(headers) + ['-ss', f"{start:.3f}", '-i', url]
+    cmd += plan.ffmpeg_args + ['-progress', 'pipe:1', '-nostats', dest_path]
+
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        # -progress writes blocks of key=value lines, each ending with progress=continue|end
+        block: Dict[str, str] = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            block[key] = value
+            if key != 'progress':
+                continue
+            if progress is not None:
+                out_time_us = block.get('out_time_us', '')
+                total_size = block.get('total_size', '')
+                progress(
+                    int(out_time_us) / 1e6 if out_time_us.isdigit() else 0.0,
+                    int(total_size) if total_size.isdigit() else 0
+                )
+            block = {}
+        stderr = process.stderr.read()
+        process.wait()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        process.stdout.close()
+        process.stderr.close()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.strip()[-500:]}")
@@ -2,24 +2,62 @@
 FFmpeg Manager Module
 
 This module provides a centralized way to check, download, and configure FFmpeg.
-It will automatically download FFmpeg if not found on the system.
+On Windows it downloads FFmpeg if it is not found on the system.
+
+Nothing happens at import time. FFmpeg is resolved the first time a
+postprocessing step calls get_ffmpeg_info() or ensure_ffmpeg(). The probe
+result is cached per process and on disk, and is only refreshed when the
+binary's modification time changes, so later starts run no subprocesses.
 """
 
 import os
+import re
 import sys
+import json
+import shutil
 import zipfile
 import subprocess
 import platform
 import tempfile
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
 from urllib.request import urlretrieve
 from dotenv import load_dotenv
 
+from src.Core.metrics import timed
+
 # Path constants
 FFMPEG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'ffmpeg_bin')
 ENV_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), '.env')
+PROBE_CACHE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), '.ffmpeg_probe.json')
+
+
+@dataclass
+class FFmpegInfo:
+    """Result of probing an FFmpeg binary"""
+    path: str
+    mtime: float
+    version: str = ""
+    encoders: List[str] = field(default_factory=list)
+    muxers: List[str] = field(default_factory=list)
+
+    @property
+    def bin_dir(self) -> str:
+        return os.path.dirname(self.path)
+
+    def has_encoder(self, name: str) -> bool:
+        return name in self.encoders
+
+    def has_muxer(self, name: str) -> bool:
+        return name in self.muxers
 
-# Flag to track if FFmpeg has been configured
-_ffmpeg_configured = False
+
+# Probe result for this process, guarded by _ffmpeg_lock
+_ffmpeg_info: Optional[FFmpegInfo] = None
+# Set once FFmpeg couldn't be found or set up, so it isn't downloaded again on every call
+_ffmpeg_missing = False
+_ffmpeg_lock = threading.Lock()
 
 
 def _download_progress(count, block_size, total_size):
@@ -43,17 +81,16 @@ def _is_ffmpeg_in_path():
 
 
 def _download_and_setup_ffmpeg():
-    """Download and setup FFmpeg"""
+    """Download and setup FFmpeg (Windows only)"""
+    # Only a Windows build is provided; elsewhere FFmpeg comes from the system package manager
+    if platform.system() != "Windows":
+        print("FFmpeg not found. Install it with your system's package manager.")
+        return False
+    download_url = "https://github.com/BtbN/FFmpeg-Builds/releases/download/latest/ffmpeg-master-latest-win64-gpl.zip"
+    
     # Create directory for FFmpeg
     os.makedirs(FFMPEG_DIR, exist_ok=True)
     
-    # Download URL for FFmpeg
-    if platform.system() == "Windows":
-        download_url = "https://github.com/BtbN/FFmpeg-Builds/releases/download/latest/ffmpeg-master-latest-win64-gpl.zip"
-    else:
-        # For Linux/Mac, we'd want different URLs, but for now, we'll focus on Windows
-        download_url = "https://github.com/BtbN/FFmpeg-Builds/releases/download/latest/ffmpeg-master-latest-win64-gpl.zip"
-    
     # Set up temporary file for download
     with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as temp_zip:
         zip_path = temp_zip.name
@@ -106,67 +143,151 @@ def _download_and_setup_ffmpeg():
             os.unlink(zip_path)
 
 
-def ensure_ffmpeg():
-    """
-    Ensure FFmpeg is available to the application.
+def _find_ffmpeg_binary():
+    """Locate the FFmpeg executable without running it
     
-    This function:
-    1. Checks if FFmpeg is already in the system PATH
-    2. If not, tries to load it from the saved path in .env
-    3. If still not found, downloads and sets up FFmpeg
-    
-    Returns:
-        bool: True if FFmpeg is available, False otherwise
+    Looks in the system PATH, then the path saved in .env, then the
+    directory FFmpeg is downloaded to.
     """
-    global _ffmpeg_configured
-    
-    # If already configured in this session, return early
-    if _ffmpeg_configured:
-        return True
-    
-    # Check if FFmpeg is already in PATH
-    if _is_ffmpeg_in_path():
-        _ffmpeg_configured = True
-        return True
+    path = shutil.which('ffmpeg')
+    if path:
+        return path
     
     # Try to load from .env
     load_dotenv(ENV_FILE)
     ffmpeg_path = os.getenv('FFMPEG_PATH')
-    
     if ffmpeg_path and os.path.exists(ffmpeg_path):
-        # Add FFmpeg to PATH
-        os.environ['PATH'] = ffmpeg_path + os.pathsep + os.environ['PATH']
-        
-        # Check if it works
-        if _is_ffmpeg_in_path():
-            _ffmpeg_configured = True
-            return True
+        path = shutil.which('ffmpeg', path=ffmpeg_path)
+        if path:
+            return path
     
     # Check if FFmpeg is already downloaded in our directory
     if os.path.exists(FFMPEG_DIR):
         for item in os.listdir(FFMPEG_DIR):
             bin_path = os.path.join(FFMPEG_DIR, item, 'bin')
-            if os.path.isdir(bin_path) and os.path.exists(os.path.join(bin_path, 'ffmpeg.exe')):
-                # Add FFmpeg to PATH
-                os.environ['PATH'] = bin_path + os.pathsep + os.environ['PATH']
-                
-                # Save the path to .env file
-                with open(ENV_FILE, 'w') as f:
-                    f.write(f"FFMPEG_PATH={bin_path}")
-                
-                # Check if it works
-                if _is_ffmpeg_in_path():
-                    _ffmpeg_configured = True
-                    return True
+            if os.path.isdir(bin_path):
+                path = shutil.which('ffmpeg', path=bin_path)
+                if path:
+                    # Save the path to .env file
+                    with open(ENV_FILE, 'w') as f:
+                        f.write(f"FFMPEG_PATH={bin_path}")
+                    return path
+    
+    return None
+
+
+def _run_ffmpeg(path, *args):
+    result = subprocess.run([path, '-hide_banner', *args],
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            text=True)
+    return result.stdout if result.returncode == 0 else ""
+
+
+def _parse_codec_list(output):
+    """Parse the names out of `ffmpeg -encoders` / `ffmpeg -muxers` output"""
+    names = []
+    for line in output.splitlines():
+        # Entries look like " V....D libx264   H.264 ..." or "  E mp4   MP4 (MPEG-4 Part 14)"
+        match = re.match(r'^\s*[A-Z.]{1,6}\s+([\w,]+)\s', line)
+        if match and match.group(1) != '=':
+            names.extend(match.group(1).split(','))
+    return sorted(set(names))
+
+
+def _probe_ffmpeg(path, mtime):
+    """Run FFmpeg to read its version, encoders and muxers"""
+    with timed('ffmpeg_probe', path=path):
+        version_output = _run_ffmpeg(path, '-version')
+        if not version_output:
+            return None
+        match = re.match(r'ffmpeg version (\S+)', version_output)
+        return FFmpegInfo(
+            path=path,
+            mtime=mtime,
+            version=match.group(1) if match else "",
+            encoders=_parse_codec_list(_run_ffmpeg(path, '-encoders')),
+            muxers=_parse_codec_list(_run_ffmpeg(path, '-muxers'))
+        )
+
+
+def _load_probe_cache(path, mtime):
+    """Return the cached probe for this binary, unless it changed since"""
+    try:
+        with open(PROBE_CACHE_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('path') == path and data.get('mtime') == mtime:
+            return FFmpegInfo(**data)
+    except (OSError, ValueError, TypeError):
+        pass
+    return None
+
+
+def _save_probe_cache(info):
+    try:
+        tmp_path = f"{PROBE_CACHE_FILE}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(asdict(info), f)
+        os.replace(tmp_path, PROBE_CACHE_FILE)
+    except OSError:
+        pass
+
+
+def get_ffmpeg_info():
+    """
+    Resolve FFmpeg and return its probe result, or None if unavailable.
     
-    # If all else fails, download and set up FFmpeg
-    if _download_and_setup_ffmpeg():
-        _ffmpeg_configured = True
-        return True
+    The result is cached for the process and on disk. Both caches are
+    invalidated when the binary's modification time changes. If FFmpeg
+    can't be found, it is downloaded and set up on Windows, once per process;
+    after that, only the (cheap) lookup is repeated.
     
-    return False
+    Returns:
+        FFmpegInfo: Path, version, encoders and muxers of the binary
+    """
+    global _ffmpeg_info, _ffmpeg_missing
+    
+    with _ffmpeg_lock:
+        # Fast path: already resolved in this process and unchanged on disk
+        if _ffmpeg_info:
+            try:
+                if os.path.getmtime(_ffmpeg_info.path) == _ffmpeg_info.mtime:
+                    return _ffmpeg_info
+            except OSError:
+                pass
+            _ffmpeg_info = None
+        
+        path = _find_ffmpeg_binary()
+        
+        # If all else fails, download and set up FFmpeg
+        if not path and not _ffmpeg_missing and _download_and_setup_ffmpeg():
+            path = _find_ffmpeg_binary()
+        if not path:
+            _ffmpeg_missing = True
+            return None
+        
+        mtime = os.path.getmtime(path)
+        info = _load_probe_cache(path, mtime)
+        if not info:
+            info = _probe_ffmpeg(path, mtime)
+            if not info:
+                _ffmpeg_missing = True
+                return None
+            _save_probe_cache(info)
+        
+        # Make sure tools spawned later (yt-dlp postprocessors) find the same binary
+        if info.bin_dir not in os.environ['PATH'].split(os.pathsep):
+            os.environ['PATH'] = info.bin_dir + os.pathsep + os.environ['PATH']
+        
+        _ffmpeg_info = info
+        return info
 
 
-# Automatically attempt to configure when the module is imported
-# This allows simple usage like: import src.ffmpeg.manager
-ensure_ffmpeg()
\ No newline at end of file
+def ensure_ffmpeg():
+    """
+    Ensure FFmpeg is available to the application.
+    
+    Returns:
+        bool: True if FFmpeg is available, False otherwise
+    """
+    return get_ffmpeg_info() is not None
@@ -0,0 +1,174 @@
+"""
+Codec-aware postprocessing
+
+Decides, per stream, whether the formats chosen by yt-dlp can be stream-copied
+into the target container or have to be transcoded. Copying only rewrites the
+container, so it takes seconds instead of minutes of CPU time.
+"""
+
+import subprocess
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Codec prefixes (as reported in yt-dlp's vcodec/acodec fields) that can be
+# copied into each target container while staying playable on most devices
+COPY_COMPATIBLE_CODECS = {
+    'mp4': {
+        'video': ('avc1', 'avc3', 'h264'),
+        'audio': ('mp4a', 'aac'),
+    },
+}
+
+# Encoders used when a stream has to be transcoded
+TRANSCODE_CODECS = {
+    'mp4': {
+        'video': 'libx264',
+        'audio': 'aac',
+    },
+}
+
+# Container each audio codec is stream-copied into for audio-only downloads
+AUDIO_CONTAINERS = {
+    'mp4a': 'm4a',
+    'aac': 'm4a',
+    'opus': 'opus',
+    'vorbis': 'ogg',
+    'mp3': 'mp3',
+}
+
+COPY = 'copy'
+TRANSCODE = 'transcode'
+ABSENT = 'none'
+
+
+@dataclass
+class PostprocessPlan:
+    """How each stream of a download will be written to the target container"""
+    container: str
+    video: str = ABSENT
+    audio: str = ABSENT
+    ffmpeg_args: List[str] = field(default_factory=list)
+
+    @property
+    def mode(self) -> str:
+        """'copy' if nothing is transcoded, 'transcode' if everything is, else 'partial'"""
+        actions = [action for action in (self.video, self.audio) if action != ABSENT]
+        if not actions or all(action == COPY for action in actions):
+            return COPY
+        if all(action == TRANSCODE for action in actions):
+            return TRANSCODE
+        return 'partial'
+
+    @property
+    def profile(self) -> str:
+        """Stable identifier of the output this plan produces"""
+        return f"{self.container}/{self.video}/{self.audio}/{' '.join(self.ffmpeg_args)}"
+
+    def to_dict(self) -> Dict[str, str]:
+        return {'mode': self.mode, 'video': self.video, 'audio': self.audio, 'container': self.container}
+
+
+def _codec_action(codec: Optional[str], compatible: tuple) -> str:
+    if codec == 'none':
+        return ABSENT
+    if codec and codec.lower().startswith(compatible):
+        return COPY
+    # Unknown codecs are transcoded to be safe
+    return TRANSCODE
+
+
+def plan_postprocessing(selected_formats: List[dict], container: str = 'mp4', ffmpeg=None) -> PostprocessPlan:
+    """Build a postprocessing plan for the formats yt-dlp selected
+
+    Only merges are postprocessed: a single format is saved as downloaded, so
+    its plan copies every stream it has.
+
+    Args:
+        selected_formats (list): The selected format dicts, i.e. ``requested_formats``
+            for merged downloads or the single selected format
+        container (str): Target container extension
+        ffmpeg (FFmpegInfo, optional): Binary doing the merge; streams whose encoder it
+            lacks are copied as they are instead of transcoded
+
+    Returns:
+        PostprocessPlan: Per-stream actions and the matching ffmpeg arguments
+
+    Raises:
+        RuntimeError: ffmpeg can't write the target container
+    """
+    compatible = COPY_COMPATIBLE_CODECS[container]
+    encoders = TRANSCODE_CODECS[container]
+    plan = PostprocessPlan(container=container)
+
+    if len(selected_formats) <= 1:
+        for f in selected_formats:
+            plan.video = COPY if f.get('vcodec') != 'none' else ABSENT
+            plan.audio = COPY if f.get('acodec') != 'none' else ABSENT
+        return plan
+
+    for f in selected_formats:
+        video_action = _codec_action(f.get('vcodec'), compatible['video'])
+        audio_action = _codec_action(f.get('acodec'), compatible['audio'])
+        if video_action != ABSENT:
+            plan.video = video_action
+        if audio_action != ABSENT:
+            plan.audio = audio_action
+
+    if ffmpeg is not None:
+        if not ffmpeg.has_muxer(container):
+            raise RuntimeError(f"FFmpeg at {ffmpeg.path} can't write {container} files")
+        # A copied stream may not play everywhere, but a missing encoder would fail the whole merge
+        if plan.video == TRANSCODE and not ffmpeg.has_encoder(encoders['video']):
+            print(f"Warning: FFmpeg has no {encoders['video']} encoder, copying the video stream as it is")
+            plan.video = COPY
+        if plan.audio == TRANSCODE and not ffmpeg.has_encoder(encoders['audio']):
+            print(f"Warning: FFmpeg has no {encoders['audio']} encoder, copying the audio stream as it is")
+            plan.audio = COPY
+
+    # Only pass explicit codec arguments when something has to be transcoded;
+    # yt-dlp's merger already stream-copies by default
+    if plan.mode != COPY:
+        if plan.video != ABSENT:
+            plan.ffmpeg_args += ['-c:v', COPY if plan.video == COPY else encoders['video']]
+        if plan.audio != ABSENT:
+            plan.ffmpeg_args += ['-c:a', COPY if plan.audio == COPY else encoders['audio']]
+
+    return plan
+
+
+def plan_audio_extraction(audio_format: dict, remux: bool = True) -> PostprocessPlan:
+    """Build a plan for an audio-only download of an audio-only format
+
+    The audio is always stream-copied. Codecs with a container of their own
+    (opus downloaded in webm, say) are remuxed into it, which needs ffmpeg;
+    with ``remux=False``, or for unknown codecs, the format's container is kept.
+
+    Returns:
+        PostprocessPlan: Plan whose ``container`` is the output's extension;
+            ``ffmpeg_args`` are set when a remux is needed
+    """
+    ext = audio_format.get('ext') or 'm4a'
+    codec = (audio_format.get('acodec') or '').lower()
+    container = next((c for prefix, c in AUDIO_CONTAINERS.items() if codec.startswith(prefix)), ext)
+    if not remux:
+        container = ext
+    plan = PostprocessPlan(container=container, audio=COPY)
+    if container != ext:
+        plan.ffmpeg_args = ['-vn', '-c:a', COPY]
+    return plan
+
+
+def remux(ffmpeg_path: str, src_path: str, dest_path: str, args: List[str]) -> None:
+    """Rewrite src_path into dest_path's container with ffmpeg
+
+    Raises:
+        RuntimeError: ffmpeg failed
+    """
+    result = subprocess.run(
+        [ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-y', '-i', src_path, *args, dest_path],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()[-500:]}")
@@ -1,14 +1,69 @@
+import html
+import mimetypes
 import streamlit as st
-from src.config import DOWNLOADERS
+import time
+from src.config import downloader_registry
+from src.Core.fileserver import file_server
 
 def get_downloader_for_url(url):
-    """Find the appropriate downloader for a given URL"""
+    """Find the appropriate downloader for a given URL
+    
+    Returns a shared instance; dispatch is a host lookup in the common case.
+    """
     if not url:
         return None
+    
+    return downloader_registry.resolve(url)
+
+
+def wait_for_job(job, progress_bar, status_text, poll_interval=0.5):
+    """Mirror a background download job's progress in the given widgets until it is done
+    
+    If the script run is interrupted, the job keeps running and the next run
+    picks it up again from session state.
+    """
+    while True:
+        progress_bar.progress(job.fraction)
+        
+        # Show human-readable progress
+        downloaded_mb = job.downloaded_bytes / (1024 * 1024)
+        total_mb = job.total_bytes / (1024 * 1024)
+        if job.total > 1:
+            status_text.text(f"Downloaded {len(job.completed)}/{job.total} videos ({downloaded_mb:.1f}MB so far)")
+        elif total_mb > 0:
+            status_text.text(f"Downloaded: {downloaded_mb:.1f}MB of {total_mb:.1f}MB ({downloaded_mb / total_mb * 100:.1f}%)")
+        elif job.status == 'queued':
+            status_text.text("Waiting for a free download slot...")
+        else:
+            status_text.text(f"Downloaded: {downloaded_mb:.1f}MB")
         
-    for name, downloader_class in DOWNLOADERS.items():
-        d = downloader_class()
-        if d.supports_url(url):
-            return d
-            
-    return None 
\ No newline at end of file
+        if job.is_done:
+            break
+        time.sleep(poll_interval)
+
+
+def offer_download(result, file_name, label, key=None):
+    """Let the browser download a finished result
+    
+    When the file server runs, the browser gets a link to it and the video goes
+    from disk to the browser without passing through Streamlit; otherwise it goes
+    through a download button, which reads the file only when it is clicked, so a page offering many
+    videos doesn't load them all into memory. The content type follows the
+    file name's extension.
+    """
+    mime = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+    if file_server.running:
+        url = file_server.publish_result(result, file_name, mime=mime)
+        st.markdown(
+            f'<a href="{html.escape(url)}" download="{html.escape(file_name)}" class="download-link">💾 {html.escape(label)}</a>',
+            unsafe_allow_html=True
+        )
+        return
+    
+    st.download_button(
+        label=label,
+        data=result.read_bytes,
+        file_name=file_name,
+        mime=mime,
+        key=key
+    )
@@ -1,5 +1,11 @@
+import time
 import streamlit as st
-from src.ui.helpers import get_downloader_for_url
+from src.config import MAX_CONCURRENT_DOWNLOADS, SEGMENTED_CONNECTIONS
+from src.Core.jobs import PlaylistLoader, job_manager
+from src.ui.helpers import get_downloader_for_url, offer_download, wait_for_job
+
+# Seconds between refreshes while a playlist is still loading
+PLAYLIST_REFRESH_INTERVAL = 1.0
 
 def display_playlist_ui():
     """Display UI for downloading a playlist"""
@@ -19,8 +25,9 @@ def display_playlist_ui():
     if "playlist_data" not in st.session_state:
         st.session_state.playlist_data = {
             "current_url": "", 
-            "videos": None, 
-            "selected_videos": None,
+            "loader": None, 
+            "selected_ids": [],
+            "job_id": None,
             "searched": False
         }
     
@@ -29,61 +36,94 @@ def display_playlist_ui():
     if search_button or (url_changed and st.session_state.playlist_data["searched"]):
         st.session_state.playlist_data["current_url"] = playlist_url
         st.session_state.playlist_data["searched"] = True
+        st.session_state.playlist_data["job_id"] = None
+        st.session_state.playlist_data["selected_ids"] = []
+        
+        # Stop loading the previous playlist
+        previous = st.session_state.playlist_data["loader"]
+        if previous:
+            previous.cancel()
+        st.session_state.playlist_data["loader"] = None
         
         if "playlist" not in playlist_url.lower():
             st.error("Invalid playlist URL. Please enter a YouTube playlist URL.")
-            st.session_state.playlist_data["videos"] = None
             return
         
         # Get downloader for this URL
         downloader = get_downloader_for_url(playlist_url)
         if not downloader:
             st.error("Unsupported URL. Currently only YouTube playlists are supported.")
-            st.session_state.playlist_data["videos"] = None
             return
-            
-        with st.spinner("Fetching playlist videos..."):
-            videos = downloader.get_playlist_videos(playlist_url)
-            st.session_state.playlist_data["videos"] = videos
+        
+        # Entries are loaded in the background and shown as they arrive
+        st.session_state.playlist_data["loader"] = PlaylistLoader(downloader, playlist_url)
     
-    # Get playlist videos from session state
-    videos = st.session_state.playlist_data["videos"]
+    loader = st.session_state.playlist_data["loader"]
+    if not loader:
+        return
+    
+    # Entries loaded so far
+    videos = list(loader.entries)
     
     if not videos:
-        if st.session_state.playlist_data["searched"]:
+        if not loader.is_done:
+            with st.spinner("Fetching playlist videos..."):
+                time.sleep(PLAYLIST_REFRESH_INTERVAL)
+            st.rerun()
+        if loader.error:
+            st.error(f"Could not fetch playlist videos: {loader.error}")
+        else:
             st.error("Could not fetch playlist videos. Please check the URL.")
         return
     
-    st.success(f"Found {len(videos)} videos in playlist")
+    if loader.error:
+        st.warning(f"Loaded {len(videos)} videos before the playlist failed to load: {loader.error}")
+    elif loader.is_done:
+        st.success(f"Found {len(videos)} videos in playlist")
+    else:
+        st.info(f"Loaded {len(videos)} videos so far, the rest of the playlist is still loading...")
     
-    # Let user select videos
+    # Let user select videos (titles come from the playlist entries, no extraction needed).
+    # The selection is kept in session state, since the options grow while loading.
+    selected_ids = set(st.session_state.playlist_data["selected_ids"])
     selected_videos = st.multiselect(
         "Select videos to download",
         videos,
-        format_func=lambda x: get_downloader_for_url(x).get_video_info(x).title 
-            if get_downloader_for_url(x) and get_downloader_for_url(x).get_video_info(x) else x
+        default=[entry for entry in videos if entry.id in selected_ids],
+        format_func=lambda entry: entry.title
     )
+    st.session_state.playlist_data["selected_ids"] = [entry.id for entry in selected_videos]
     
     if not selected_videos:
+        _refresh_while_loading(loader)
         return
         
+    # Display thumbnail of first selected video
+    first_entry = selected_videos[0]
+    if first_entry.thumbnail_url:
+        st.image(first_entry.thumbnail_url, width=300, use_container_width=False)
+    
     # Get quality options from first video
-    downloader = get_downloader_for_url(selected_videos[0])
-    first_video_info = downloader.get_video_info(selected_videos[0])
+    downloader = get_downloader_for_url(first_entry.url)
+    first_video_info = downloader.get_video_info(first_entry.url)
     if not first_video_info:
         st.error("Could not fetch video information. Please try again.")
         return
         
-    # Display thumbnail of first selected video
-    if hasattr(first_video_info, 'thumbnail_url') and first_video_info.thumbnail_url:
-        st.image(first_video_info.thumbnail_url, width=300, use_container_width=False)
-        
     quality = st.selectbox(
         "Select Video Quality for all videos",
         first_video_info.available_qualities,
         help="Choose the video quality you want to download"
     )
     
+    max_workers = st.slider(
+        "Parallel downloads",
+        min_value=1,
+        max_value=MAX_CONCURRENT_DOWNLOADS,
+        value=min(3, MAX_CONCURRENT_DOWNLOADS),
+        help="How many videos the server downloads at the same time"
+    )
+    
     # Create columns for download method selection
     method_col1, method_col2 = st.columns(2)
     
@@ -103,17 +143,17 @@ def display_playlist_ui():
             stream_links = []
             
             # Create an expander for each video
-            for i, video_url in enumerate(selected_videos):
+            for i, entry in enumerate(selected_videos):
                 # Get downloader for this video
-                downloader = get_downloader_for_url(video_url)
+                downloader = get_downloader_for_url(entry.url)
                 
-                # Get video info
-                video_info = downloader.get_video_info(video_url)
-                if not video_info:
+                # Extract once and reuse the handle for the direct URL
+                resolved = downloader.resolve(entry.url)
+                if not resolved:
                     continue
                 
                 # Get direct stream URL
-                stream_info = downloader.get_direct_stream_url(video_url, quality)
+                stream_info = downloader.get_direct_stream_url(resolved, quality)
                 
                 if stream_info['success']:
                     stream_links.append(stream_info)
@@ -157,74 +197,38 @@ def display_playlist_ui():
             else:
                 st.error("Failed to generate any direct download links")
     
-    # In-memory download option (original code)
+    # In-memory download option, run as a background job so it survives reruns
     if memory_download:
+        downloader = get_downloader_for_url(selected_videos[0].url)
+        st.session_state.playlist_data["job_id"] = job_manager.submit(
+            downloader,
+            [entry.url for entry in selected_videos],
+            quality,
+            max_workers=max_workers,
+            connections=SEGMENTED_CONNECTIONS
+        )
+    
+    job = job_manager.get(st.session_state.playlist_data.get("job_id"))
+    if job:
         progress_bar = st.progress(0)
         status_text = st.empty()
-        file_progress = st.empty()
         
-        # Track overall progress
-        total_videos = len(selected_videos)
-        completed_videos = 0
-        total_bytes_downloaded = 0
+        # Downloads run in parallel, bounded by max_workers
+        wait_for_job(job, progress_bar, status_text)
         
-        # Update the overall progress bar
-        status_text.text(f"Downloading {total_videos} videos (0%)")
+        # Videos are listed in completion order
+        downloaded = [
+            {
+                'title': result.video_info['title'],
+                'result': result,
+                'file_size': result.video_info.get('file_size', 0)
+            }
+            for result in job.successful_results()
+        ]
         
-        downloaded = []
-        for i, video_url in enumerate(selected_videos):
-            downloader = get_downloader_for_url(video_url)
-            video_info = downloader.get_video_info(video_url)
-            if not video_info:
-                continue
-                
-            video_status = f"Downloading {i+1}/{total_videos}: {video_info.title}"
-            status_text.text(video_status)
-            
-            # Define progress hook for current video
-            current_bytes = 0
-            max_bytes = 0
-            
-            def progress_hook(d):
-                nonlocal current_bytes, max_bytes
-                if d['status'] == 'downloading':
-                    current_bytes = d.get('downloaded_bytes', 0)
-                    max_bytes = d.get('total_bytes', 0) or d.get('total_bytes_estimate', 0)
-                    
-                    # Show file size progress
-                    downloaded_mb = current_bytes / (1024 * 1024)
-                    total_mb = max_bytes / (1024 * 1024) if max_bytes else 0
-                    
-                    if total_mb > 0:
-                        percentage = current_bytes / max_bytes * 100
-                        file_progress.text(f"Current file: {downloaded_mb:.1f}MB of {total_mb:.1f}MB ({percentage:.1f}%)")
-                    else:
-                        file_progress.text(f"Current file: {downloaded_mb:.1f}MB downloaded")
-            
-            # Download with progress hook
-            result = downloader.download_video(video_url, quality, progress_hook=progress_hook)
-            
-            if result.success:
-                # Add file size to total
-                file_size = current_bytes or result.video_info.get('file_size', 0)
-                total_bytes_downloaded += file_size
-                
-                downloaded.append({
-                    'title': result.video_info['title'],
-                    'data': result.data,
-                    'file_size': file_size
-                })
-                
-                # Update completed count
-                completed_videos += 1
-            
-            # Update overall progress
-            progress_percentage = completed_videos / total_videos
-            progress_bar.progress(progress_percentage)
-            
-            # Show overall progress with MB
-            total_mb_downloaded = total_bytes_downloaded / (1024 * 1024)
-            status_text.text(f"Downloaded {completed_videos}/{total_videos} videos ({total_mb_downloaded:.1f}MB total)")
+        # Show overall progress with MB
+        total_mb_downloaded = sum(video['file_size'] for video in downloaded) / (1024 * 1024)
+        status_text.text(f"Downloaded {len(downloaded)}/{job.total} videos ({total_mb_downloaded:.1f}MB total)")
         
         if downloaded:
             # Calculate total size
@@ -237,12 +241,11 @@ def display_playlist_ui():
                 # Get file size in MB
                 video_size_mb = video.get('file_size', 0) / (1024 * 1024)
                 
-                st.download_button(
-                    label=f"Click to Download: {video['title']} ({video_size_mb:.1f}MB)",
-                    data=video['data'],
-                    file_name=f"{video['title']}.mp4",
-                    mime="video/mp4",
-                    key=video['title']
+                offer_download(
+                    video['result'],
+                    f"{video['title']}.mp4",
+                    f"Click to Download: {video['title']} ({video_size_mb:.1f}MB)",
+                    key=f"{job.id}-{i}"
                 )
                 
                 # Add note about playback
@@ -255,4 +258,15 @@ def display_playlist_ui():
                     - For best playback results, use VLC media player
                     """)
         else:
-            st.error("Failed to download any videos")
\ No newline at end of file
+            st.error("Failed to download any videos")
+    
+    # Direct links only exist in this run, so don't rerun them away
+    if not stream_download:
+        _refresh_while_loading(loader)
+
+
+def _refresh_while_loading(loader):
+    """Rerun the script shortly to show entries that arrived in the meantime"""
+    if not loader.is_done:
+        time.sleep(PLAYLIST_REFRESH_INTERVAL)
+        st.rerun()
\ No newline at end of file
@@ -1,7 +1,8 @@
 import streamlit as st
-import time
 import webbrowser
-from src.ui.helpers import get_downloader_for_url
+from src.config import AUDIO_QUALITIES, SEGMENTED_CONNECTIONS
+from src.Core.jobs import job_manager
+from src.ui.helpers import get_downloader_for_url, offer_download, wait_for_job
 
 def display_single_video_ui():
     """Display UI for downloading a single video"""
@@ -19,13 +20,14 @@ def display_single_video_ui():
         
     # Store the URL and video info in session state so they persist between interactions
     if "video_data" not in st.session_state:
-        st.session_state.video_data = {"current_url": "", "video_info": None, "searched": False}
+        st.session_state.video_data = {"current_url": "", "video_info": None, "job_id": None, "searched": False}
     
     # Process the URL only when search button is clicked or URL has changed
     url_changed = st.session_state.video_data["current_url"] != url
     if search_button or (url_changed and st.session_state.video_data["searched"]):
         st.session_state.video_data["current_url"] = url
         st.session_state.video_data["searched"] = True
+        st.session_state.video_data["job_id"] = None
         
         # Get downloader for this URL
         downloader = get_downloader_for_url(url)
@@ -35,8 +37,10 @@ def display_single_video_ui():
             return
             
         with st.spinner("Fetching video information..."):
-            video_info = downloader.get_video_info(url)
-            st.session_state.video_data["video_info"] = video_info
+            # Only plain info is kept in session state. The extracted handle holds
+            # direct media URLs that expire, so actions below look the URL up again,
+            # which the metadata cache answers until its entry is too old.
+            st.session_state.video_data["video_info"] = downloader.get_video_info(url)
             
     # Get video info from session state
     video_info = st.session_state.video_data["video_info"]
@@ -59,17 +63,41 @@ def display_single_video_ui():
     duration_str = f"{hours:02d}:{mins:02d}:{secs:02d}" if hours else f"{mins:02d}:{secs:02d}"
     st.info(f"Duration: {duration_str}")
     
-    quality = st.selectbox(
-        "Select Video Quality",
-        video_info.available_qualities,
-        help="Choose the video quality you want to download"
+    audio_only = st.checkbox(
+        "Audio only",
+        help="Download just the audio track, without fetching the video"
     )
     
+    if audio_only:
+        quality = st.selectbox(
+            "Select Audio Quality",
+            AUDIO_QUALITIES[::-1],
+            help="Maximum audio bitrate; the audio is saved as it is streamed, without re-encoding"
+        )
+    else:
+        quality = st.selectbox(
+            "Select Video Quality",
+            video_info.available_qualities,
+            help="Choose the video quality you want to download"
+        )
+    
+    # Only the seconds in the range are fetched, not the whole video
+    clip = None
+    if not audio_only and video_info.duration and st.checkbox("Only a time range", help="Download just part of the video"):
+        clip = st.slider(
+            "Time range (seconds)",
+            min_value=0,
+            max_value=int(video_info.duration),
+            value=(0, min(int(video_info.duration), 30)),
+            help="The clip starts at the nearest keyframe before the start"
+        )
+    
     # Create columns for download options
     col1, col2 = st.columns(2)
     
     with col1:
-        if st.button("Download via Browser (Streaming)"):
+        # Direct links are only offered for videos
+        if not audio_only and st.button("Download via Browser (Streaming)"):
             with st.spinner("Preparing direct download stream..."):
                 # Need to get the downloader again as it's not stored in session state
                 downloader = get_downloader_for_url(url)
@@ -112,69 +140,50 @@ def display_single_video_ui():
     
     with col2:
         if st.button("Download via Server (In-Memory)"):
-            # Display a progress container
-            progress_container = st.container()
-            progress_bar = progress_container.progress(0)
-            status_text = progress_container.empty()
-            
-            with st.spinner(f"Preparing {video_info.title} for download..."):
-                # Need to get the downloader again as it's not stored in session state
-                downloader = get_downloader_for_url(url)
-                start_time = time.time()
-                
-                # Show initial status
-                status_text.text("Starting download...")
-                
-                # Define a callback to update progress
-                file_size = 0
-                max_size = 0
-                
-                def progress_hook(d):
-                    nonlocal file_size, max_size
-                    if d['status'] == 'downloading':
-                        file_size = d.get('downloaded_bytes', 0)
-                        max_size = d.get('total_bytes', 0) or d.get('total_bytes_estimate', 0)
-                        
-                        # Calculate percentage
-                        if max_size > 0:
-                            percentage = file_size / max_size
-                            progress_bar.progress(min(percentage, 1.0))
-                        
-                        # Show human-readable progress
-                        downloaded_mb = file_size / (1024 * 1024)
-                        total_mb = max_size / (1024 * 1024) if max_size else 0
-                        
-                        if total_mb > 0:
-                            status_text.text(f"Downloaded: {downloaded_mb:.1f}MB of {total_mb:.1f}MB ({percentage*100:.1f}%)")
-                        else:
-                            status_text.text(f"Downloaded: {downloaded_mb:.1f}MB")
-                
-                # Download with progress hook
-                result = downloader.download_video(url, quality, progress_hook=progress_hook)
-                download_time = time.time() - start_time
-                
-                if result.success:
-                    # Complete the progress bar
-                    progress_bar.progress(1.0)
-                    status_text.text(f"Download complete: {file_size/(1024*1024):.1f}MB")
-                    
-                    st.success(f"Video processed successfully in {download_time:.1f} seconds!")
-                    
-                    # Create download button
-                    st.download_button(
-                        label="Click to Download Video",
-                        data=result.data,
-                        file_name=f"{result.video_info['title']}.mp4",
-                        mime="video/mp4"
-                    )
-                    
-                    # Download tips
-                    st.info("""
-                    📝 **Download Tips**: 
-                    - If download doesn't start automatically, right-click the button and select "Save link as..."
-                    - For large videos, download may take a while to start in the browser
-                    - The video is in MP4 format compatible with most devices
-                    - For best playback results, use VLC media player
-                    """)
-                else:
-                    st.error(f"Failed to download video: {result.error}") 
\ No newline at end of file
+            # Run the download as a background job so it survives reruns and navigation
+            downloader = get_downloader_for_url(url)
+            st.session_state.video_data["job_id"] = job_manager.submit(
+                downloader, [url], quality, connections=SEGMENTED_CONNECTIONS, audio_only=audio_only, clip=clip
+            )
+        
+        # Show the job for this video, if any, picking it up again after a rerun
+        job = job_manager.get(st.session_state.video_data.get("job_id"))
+        if job:
+            display_download_job(job)
+
+
+def display_download_job(job):
+    """Display progress of a single-video download job and its result once finished"""
+    # Display a progress container
+    progress_container = st.container()
+    progress_bar = progress_container.progress(0)
+    status_text = progress_container.empty()
+    
+    with st.spinner("Preparing video for download..."):
+        wait_for_job(job, progress_bar, status_text)
+    
+    results = job.successful_results()
+    if results:
+        result = results[0]
+        status_text.text(f"Download complete: {result.video_info['file_size']/(1024*1024):.1f}MB")
+        
+        st.success(f"Video processed successfully in {job.elapsed:.1f} seconds!")
+        
+        # Served from disk, by the file server or when the button is clicked
+        # (the job manager deletes the file when the job expires)
+        ext = result.video_info.get('ext', 'mp4')
+        if job.audio_only:
+            offer_download(result, f"{result.video_info['title']}.{ext}", "Click to Download Audio")
+            return
+        offer_download(result, f"{result.video_info['title']}.{ext}", "Click to Download Video")
+        
+        # Download tips
+        st.info("""
+        📝 **Download Tips**: 
+        - If download doesn't start automatically, right-click the button and select "Save link as..."
+        - For large videos, download may take a while to start in the browser
+        - The video is in MP4 format compatible with most devices
+        - For best playback results, use VLC media player
+        """)
+    else:
+        st.error(f"Failed to download video: {job.error}")
@@ -0,0 +1,98 @@
+"""
+Tests for background download jobs and the progress they report
+
+Jobs run against a stub downloader on a private progress bus, so the progress
+a job shows is exactly what went through the bus.
+"""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.Core.base import BaseDownloader, DownloadResult
+from src.Core.events import DONE, DOWNLOADING, ERROR, ProgressBus, ProgressEvent
+from src.Core.jobs import FINISHED, JobManager
+
+SIZES = [300000, 500000, 700000]
+
+
+class StubDownloader(BaseDownloader):
+    """Reports a few yt-dlp style progress samples per item, then returns its bytes
+
+    URLs are indexes into SIZES; "fail" fails the item.
+    """
+
+    def resolve(self, url):
+        return None
+
+    def get_video_info(self, url):
+        return None
+
+    def get_playlist_videos(self, url):
+        return []
+
+    def supports_url(self, url):
+        return True
+
+    def download_video(self, url, quality, progress_hook=None, as_file=False, connections=1, bandwidth_group=None):
+        if url == 'fail':
+            return DownloadResult(success=False, error="Video unavailable")
+        size = SIZES[int(url)]
+        # A sample estimate below the final size, as yt-dlp reports before a merge
+        estimate = size // 2
+        for downloaded in (0, estimate // 2, estimate):
+            progress_hook({'status': 'downloading', 'downloaded_bytes': downloaded, 'total_bytes': estimate})
+            time.sleep(0.02)
+        progress_hook({'status': 'finished', 'downloaded_bytes': estimate, 'total_bytes': estimate})
+        return DownloadResult(success=True, data=b'x' * size, video_info={'title': url})
+
+
+class JobProgressTest(unittest.TestCase):
+    def setUp(self):
+        self.bus = ProgressBus()
+        self.manager = JobManager(max_jobs=1, retries=0, bus=self.bus, progress_interval=0.05)
+
+    def run_job(self, urls):
+        job = self.manager.get(self.manager.submit(StubDownloader(), urls, "720p", max_workers=len(urls)))
+        deadline = time.time() + 10
+        # The final events reach the job shortly after it finishes
+        while time.time() < deadline:
+            if job.is_done and all(job.progress.get(i, {}).get('stage') in (DONE, ERROR) for i in range(job.total)):
+                break
+            time.sleep(0.02)
+        return job
+
+    def test_finished_job_reports_final_sizes(self):
+        job = self.run_job(['0', '1', '2'])
+
+        self.assertEqual(job.status, FINISHED)
+        for index, size in enumerate(SIZES):
+            self.assertEqual(job.progress[index]['stage'], DONE)
+            self.assertEqual(job.progress[index]['downloaded_bytes'], size)
+            self.assertEqual(job.progress[index]['total_bytes'], size)
+        self.assertEqual(job.downloaded_bytes, sum(SIZES))
+        self.assertEqual(job.total_bytes, sum(SIZES))
+        self.assertEqual(job.fraction, 1.0)
+
+    def test_failed_item_keeps_its_error(self):
+        job = self.run_job(['0', 'fail'])
+
+        self.assertEqual(job.status, FINISHED)
+        self.assertEqual(job.progress[0]['stage'], DONE)
+        self.assertEqual(job.progress[1]['stage'], ERROR)
+        self.assertEqual(job.progress[1]['error'], "Video unavailable")
+        self.assertEqual(job.downloaded_bytes, SIZES[0])
+
+    def test_late_sample_does_not_reopen_a_finished_item(self):
+        job = self.run_job(['0'])
+        self.manager._on_events([ProgressEvent(source=job.id, index=0, stage=DOWNLOADING, downloaded_bytes=1)])
+
+        self.assertEqual(job.progress[0]['stage'], DONE)
+        self.assertEqual(job.downloaded_bytes, SIZES[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
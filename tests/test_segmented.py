@@ -0,0 +1,212 @@
+"""
+Tests for segmented downloads against a local range-capable HTTP server
+
+Covers splitting, multi-connection fetching, the single-connection fallback,
+resuming from a state file, retrying dropped segments, and the yt-dlp
+integration (format headers, cookies and proxy going through the YoutubeDL).
+"""
+
+import http.cookiejar
+import os
+import re
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.Core.segmented import MIN_SEGMENTED_SIZE, SegmentedDownloader, SegmentedYoutubeDL
+
+SIZE = MIN_SEGMENTED_SIZE + 1234567
+SEGMENT_SIZE = 512 * 1024
+PAYLOAD = bytes(i * 7 % 251 for i in range(SIZE))
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD for any path, honouring single byte ranges unless disabled"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        try:
+            self._serve()
+        except (BrokenPipeError, ConnectionResetError):
+            # Clients hang up after reading what they need, e.g. after a probe
+            self.close_connection = True
+
+    def _serve(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, dict(self.headers)))
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if not match or not server.ranges:
+            self.send_response(200)
+            self.send_header('Content-Length', str(SIZE))
+            self.end_headers()
+            self.wfile.write(PAYLOAD)
+            return
+
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else SIZE - 1
+        body = PAYLOAD[start:end + 1]
+        self.send_response(206)
+        self.send_header('Content-Range', f"bytes {start}-{end}/{SIZE}")
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        with server.lock:
+            drop = server.drops > 0 and len(body) > 1
+            if drop:
+                server.drops -= 1
+        if drop:
+            # Send half the range, then hang up
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+class SegmentedTestCase(unittest.TestCase):
+    ranges = True
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MediaHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.ranges = self.ranges
+        self.server.drops = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/media.mp4"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = os.path.join(self.tmp.name, 'out.mp4')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def range_requests(self):
+        # Everything but the size probe
+        return [headers['Range'] for _, headers in self.server.requests if headers.get('Range', 'bytes=0-0') != 'bytes=0-0']
+
+    def read_dest(self):
+        with open(self.dest, 'rb') as f:
+            return f.read()
+
+
+class SplitTest(unittest.TestCase):
+    def test_ranges_cover_the_file_without_overlap(self):
+        segments = SegmentedDownloader(segment_size=10).split(35)
+        self.assertEqual(segments, [(0, 9), (10, 19), (20, 29), (30, 34)])
+
+    def test_small_file_is_one_segment(self):
+        self.assertEqual(SegmentedDownloader(segment_size=10).split(3), [(0, 2)])
+
+
+class RangeServerTest(SegmentedTestCase):
+    def test_probe(self):
+        self.assertEqual(SegmentedDownloader().probe(self.url), (SIZE, True))
+
+    def test_fetches_every_segment_over_several_connections(self):
+        progress = []
+        fetcher = SegmentedDownloader(connections=4, segment_size=SEGMENT_SIZE)
+        written = fetcher.fetch(self.url, self.dest, progress=lambda done, total: progress.append((done, total)))
+
+        self.assertEqual(written, SIZE)
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        self.assertEqual(len(self.range_requests()), len(fetcher.split(SIZE)))
+        self.assertEqual(progress[-1], (SIZE, SIZE))
+
+    def test_single_connection_fetches_in_one_request(self):
+        SegmentedDownloader(connections=1, segment_size=SEGMENT_SIZE).fetch(self.url, self.dest)
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        self.assertEqual(self.range_requests(), [])
+
+    def test_resumes_only_missing_segments(self):
+        fetcher = SegmentedDownloader(connections=2, segment_size=SEGMENT_SIZE)
+        segments = fetcher.split(SIZE)
+        state_path = f"{self.dest}.segments"
+        # An earlier attempt finished the first two segments
+        with open(self.dest, 'wb') as f:
+            f.write(PAYLOAD[:segments[1][1] + 1])
+            f.truncate(SIZE)
+        fetcher._save_state(state_path, SIZE, {segments[0][0], segments[1][0]})
+
+        fetcher.fetch(self.url, self.dest, state_path=state_path)
+
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        self.assertEqual(len(self.range_requests()), len(segments) - 2)
+        self.assertFalse(os.path.exists(state_path))
+
+    def test_dropped_segment_is_resumed_where_it_stopped(self):
+        self.server.drops = 1
+        fetcher = SegmentedDownloader(connections=2, segment_size=SEGMENT_SIZE, retries=2)
+        fetcher.fetch(self.url, self.dest)
+
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        self.assertEqual(len(self.range_requests()), len(fetcher.split(SIZE)) + 1)
+
+    def test_gives_up_after_retries(self):
+        self.server.drops = 100
+        fetcher = SegmentedDownloader(connections=2, segment_size=SEGMENT_SIZE, retries=1)
+        with self.assertRaises(IOError):
+            fetcher.fetch(self.url, self.dest)
+
+
+class NoRangeServerTest(SegmentedTestCase):
+    ranges = False
+
+    def test_falls_back_to_a_single_connection(self):
+        self.assertEqual(SegmentedDownloader().probe(self.url), (SIZE, False))
+        written = SegmentedDownloader(connections=4, segment_size=SEGMENT_SIZE).fetch(self.url, self.dest)
+
+        self.assertEqual(written, SIZE)
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        self.assertEqual(self.range_requests(), [])
+
+
+class YoutubeDLIntegrationTest(SegmentedTestCase):
+    def download(self, url, **params):
+        info = {
+            'id': 'media', 'title': 'media', 'ext': 'mp4', 'url': url, 'protocol': 'http',
+            'extractor': 'generic', 'extractor_key': 'Generic', 'webpage_url': url,
+            'http_headers': {'X-Format-Header': 'yes'},
+        }
+        with SegmentedYoutubeDL(dict({
+            'quiet': True, 'noprogress': True, 'outtmpl': self.dest,
+            'segmented_connections': 4, 'http_chunk_size': 0,
+        }, **params)) as ydl:
+            ydl.cookiejar.set_cookie(http.cookiejar.Cookie(
+                0, 'session', 'abc', None, False, '127.0.0.1', False, False, '/', True,
+                False, None, False, None, None, {}))
+            ydl.process_ie_result(info, download=True)
+
+    def test_requests_carry_format_headers_and_cookies(self):
+        self.download(self.url)
+
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        ranged = [headers for _, headers in self.server.requests if headers.get('Range')]
+        # The size probe and at least one segment
+        self.assertGreaterEqual(len(ranged), 2)
+        for headers in ranged:
+            self.assertEqual(headers.get('X-Format-Header'), 'yes')
+            self.assertEqual(headers.get('Accept-Encoding'), 'identity')
+            self.assertIn('session=abc', headers.get('Cookie', ''))
+
+    def test_requests_go_through_the_configured_proxy(self):
+        # The server doubles as an HTTP proxy: it sees absolute URLs for another host
+        proxy = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.download('http://media.invalid/media.mp4', proxy=proxy)
+
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        paths = {path for path, _ in self.server.requests}
+        self.assertEqual(paths, {'http://media.invalid/media.mp4'})
+
+
+if __name__ == '__main__':
+    unittest.main()